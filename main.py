@@ -1,26 +1,43 @@
+import os
+import sys
+import json
+from datetime import datetime
+from typing import Literal, Optional
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-import joblib
 import numpy as np
 import logging
 from fastapi.middleware.cors import CORSMiddleware
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+from model_registry import load_latest_or_legacy, parse_quantiles
+from price_rollups import iter_prices
+from drift_monitor import check_drift, format_prometheus
+from admission_control import AdmissionController, AdmissionMiddleware, ADMISSION_RETRY_AFTER
+
 # Configuración de logs
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
 
-# Cargar modelo entrenado
-MODEL_PATH = "models/energy_price_model.pkl"
+BIDDING_ZONE = os.getenv("BIDDING_ZONE", "DE-LU")
+PRICES_STREAM_CHUNK = 1000  # Líneas NDJSON por fragmento de la respuesta
+
+# Cargar el último modelo publicado en el registro (o el pickle antiguo si el registro está vacío)
 try:
-    model, scaler = joblib.load(MODEL_PATH)
-    logger.info("Modelo cargado exitosamente.")
+    model, scaler, model_metadata = load_latest_or_legacy()
+    logger.info(f"Modelo versión {model_metadata['version']} cargado exitosamente.")
 except Exception as e:
     logger.error(f"Error al cargar el modelo: {e}")
-    raise RuntimeError("No se pudo cargar el modelo. Asegúrate de que el archivo existe y es válido.")
+    raise RuntimeError("No se pudo cargar el modelo. Asegúrate de que el registro de modelos existe y es válido.")
 
 # Inicializar FastAPI
 app = FastAPI(title="Energy Price Prediction API", description="API para predecir el precio de la energía basado en datos climáticos.", version="1.0")
 
+# Control de admisión: limitar /predict/ en vez de encolar sin límite en el threadpool
+admission = AdmissionController()
+app.add_middleware(AdmissionMiddleware, controller=admission)
+
 # Configurar CORS
 app.add_middleware(
     CORSMiddleware,
@@ -43,13 +60,17 @@ class EnergyPredictionRequest(BaseModel):
     wind_speed_100m: float
     wind_direction_10m: float
     wind_direction_100m: float
-    days_since_start: int  # Representa la distancia en días desde el inicio del dataset
+    days_since_start: int  # Días desde el inicio del dataset (`days_since_start_origin` en los metadatos del modelo)
 
 @app.post("/predict/", summary="Realizar predicción de precios de energía", response_model=dict)
-def predict(data: EnergyPredictionRequest):
+def predict(data: EnergyPredictionRequest, quantiles: Optional[str] = None, include_std: bool = False):
     """
     Recibe datos climáticos y predice el precio de la energía en EUR/MWh.
 
+    Parámetros opcionales (query) para obtener bandas de incertidumbre a partir de las predicciones de cada árbol:
+    - quantiles: cuantiles separados por comas (Ej: 0.1,0.9)
+    - include_std: incluir la desviación típica entre árboles
+
     Ejemplos de parametros esperados:
     - max_temperature: Temperatura máxima (Ej: 38.9)
     - min_temperature: Temperatura mínima (Ej: -24.3)
@@ -76,7 +97,14 @@ def predict(data: EnergyPredictionRequest):
 
     Devuelve:
     - Predicción del precio de la energía en EUR/MWh.
+    - prediction_interval (si se solicita): cuantiles y/o desviación típica en EUR/MWh.
     """
+    try:
+        quantile_values = parse_quantiles(quantiles)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if (quantile_values or include_std) and not model.supports_intervals:
+        raise HTTPException(status_code=400, detail="El modelo publicado no ofrece intervalos de predicción.")
 
     try:
         # Convertir entrada en array de numpy
@@ -91,25 +119,70 @@ def predict(data: EnergyPredictionRequest):
         # Normalizar los datos de entrada
         features_scaled = scaler.transform(features)
 
-        # Realizar predicción
-        prediction = model.predict(features_scaled)
+        # Realizar predicción (una sola pasada sobre todos los árboles)
+        prediction = model.predict_distribution(features_scaled, quantile_values, include_std)
 
         # Responder con el resultado
         response = {
-            "predicted_price": round(float(prediction[0]), 2),
+            "predicted_price": round(float(prediction["mean"][0]), 2),
             "unit": "EUR/MWh",
             "input_data": data.dict()
         }
+        if quantile_values or include_std:
+            interval = {}
+            if quantile_values:
+                interval["quantiles"] = {str(q): round(float(v[0]), 2) for q, v in prediction["quantiles"].items()}
+            if include_std:
+                interval["std"] = round(float(prediction["std"][0]), 2)
+            response["prediction_interval"] = interval
         logger.info(f"Predicción realizada: {response}")
         return response
     except Exception as e:
         logger.error(f"Error en la predicción: {e}")
         raise HTTPException(status_code=500, detail=f"Error al realizar la predicción: {e}")
 
+@app.get("/prices", summary="Consultar el histórico de precios de energía")
+def prices(start: datetime, end: datetime, zone: str = BIDDING_ZONE,
+           resolution: Literal["raw", "hourly", "daily"] = "hourly"):
+    """
+    Devuelve los precios entre `start` (incluido) y `end` (excluido) como NDJSON en streaming.
+
+    - resolution=raw: precios tal como se ingirieron (timestamp, price, currency).
+    - resolution=hourly/daily: agregados precalculados (timestamp, min, max, mean, count).
+    """
+    if end <= start:
+        raise HTTPException(status_code=400, detail="El parámetro 'end' debe ser posterior a 'start'.")
+
+    def generate():
+        lines = []
+        for row in iter_prices(zone, start, end, resolution):
+            lines.append(json.dumps(row))
+            if len(lines) >= PRICES_STREAM_CHUNK:
+                yield "\n".join(lines) + "\n"
+                lines = []
+        if lines:
+            yield "\n".join(lines) + "\n"
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+@app.get("/metrics", summary="Métricas de deriva y error del modelo (formato Prometheus)", response_class=PlainTextResponse)
+def metrics():
+    """ Exporta la deriva de las variables meteorológicas, el MAE móvil y el estado del control de admisión. """
+    return format_prometheus(check_drift(save=False)) + admission.format_prometheus()
+
+# Healthcheck y readiness son async: se ejecutan en el event loop, sin esperar hilos libres del threadpool
 @app.get("/healthcheck/", summary="Verificar el estado del servicio", response_model=dict)
-def healthcheck():
+async def healthcheck():
     """ Verifica si la API está funcionando correctamente. """
-    return {"status": "ok", "message": "API en funcionamiento."}
+    return {"status": "ok", "message": "API en funcionamiento.", "model_version": model_metadata["version"]}
+
+@app.get("/readiness/", summary="Verificar si el servicio admite más peticiones", response_model=dict)
+async def readiness():
+    """ Devuelve 503 mientras la cola de predicciones está llena, para que el balanceador envíe tráfico a otra réplica. """
+    if admission.saturated():
+        return JSONResponse({"status": "saturated", "admission": admission.status()}, status_code=503,
+                            headers={"Retry-After": str(ADMISSION_RETRY_AFTER)})
+    return {"status": "ready", "model_version": model_metadata["version"], "admission": admission.status()}
 
 if __name__ == "__main__":
     import uvicorn
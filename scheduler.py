@@ -12,6 +12,10 @@ sys.stdout.reconfigure(line_buffering=True)  # 🚀 Forzar salida inmediata de l
 # Configuración de tiempos de ejecución desde variables de entorno
 EXTRACTION_INTERVAL = int(os.getenv("EXTRACTION_INTERVAL", 3600))  # 1 hora por defecto
 TRAINING_INTERVAL = int(os.getenv("TRAINING_INTERVAL", 86400))  # 24 horas por defecto
+TRAINING_TRIGGER = os.getenv("TRAINING_TRIGGER", "drift")  # always: reentrenar siempre | drift: solo si hay deriva o error alto
+SCHEDULER_MODE = os.getenv("SCHEDULER_MODE", "interval")  # interval: entrenamiento periódico | events: por change streams
+TUNING_INTERVAL = int(os.getenv("TUNING_INTERVAL", 0))  # Búsqueda de hiperparámetros periódica (0 = desactivada)
+GAP_FILL_ENABLED = os.getenv("GAP_FILL_ENABLED", "true").lower() == "true"  # Rellenar huecos tras cada extracción
 
 scheduler = BackgroundScheduler()
 
@@ -22,6 +26,8 @@ def run_extraction():
     try:
         subprocess.run(["python", "src/data_ingestion.py"], check=True)
         subprocess.run(["python", "src/data_ingestion_meteo.py"], check=True)
+        if GAP_FILL_ENABLED:
+            subprocess.run(["python", "src/gap_filler.py"], check=True)
         print(f"✅ [{now}] Extracción completada con éxito")
     except subprocess.CalledProcessError as e:
         print(f"❌ [{now}] Error en extracción: {e}")
@@ -29,6 +35,12 @@ def run_extraction():
 
 def run_training():
     now = datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+    if TRAINING_TRIGGER == "drift":
+        # drift_monitor.py sale con código 10 si hay que reentrenar y 0 si el modelo sigue siendo válido
+        check = subprocess.run(["python", "src/drift_monitor.py", "check"])
+        if check.returncode == 0:
+            print(f"⏭️ [{now}] Sin deriva ni degradación del error, se omite el entrenamiento")
+            return
     print(f"📊 [{now}] Ejecutando entrenamiento del modelo...")
     try:
         subprocess.run(["python", "src/train_model_batch.py"], check=True)
@@ -37,19 +49,45 @@ def run_training():
         print(f"❌ [{now}] Error en entrenamiento: {e}")
 
 
+def run_tuning():
+    now = datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+    print(f"🔍 [{now}] Ejecutando búsqueda de hiperparámetros...")
+    try:
+        subprocess.run(["python", "src/tune_model.py"], check=True)
+        print(f"✅ [{now}] Búsqueda completada, el próximo entrenamiento usará la mejor configuración")
+    except subprocess.CalledProcessError as e:
+        print(f"❌ [{now}] Error en la búsqueda de hiperparámetros: {e}")
+
+
 # Programar las tareas con margen de gracia para evitar saltos
 scheduler.add_job(run_extraction, IntervalTrigger(seconds=EXTRACTION_INTERVAL),
                   id="extraction", replace_existing=True, misfire_grace_time=60)
-scheduler.add_job(run_training, IntervalTrigger(seconds=TRAINING_INTERVAL),
-                  id="training", replace_existing=True, misfire_grace_time=60)
+if SCHEDULER_MODE == "interval":
+    scheduler.add_job(run_training, IntervalTrigger(seconds=TRAINING_INTERVAL),
+                      id="training", replace_existing=True, misfire_grace_time=60)
+if TUNING_INTERVAL > 0:
+    scheduler.add_job(run_tuning, IntervalTrigger(seconds=TUNING_INTERVAL),
+                      id="tuning", replace_existing=True, misfire_grace_time=60)
+
+
+def start_event_pipeline():
+    """En modo events, las inserciones en MongoDB disparan el rescoring y el reentrenamiento."""
+    print("👂 Iniciando pipeline por eventos (change streams / polling)...")
+    return subprocess.Popen(["python", "src/event_pipeline.py"])
 
 if __name__ == "__main__":
     print("\n🎯 Iniciando Scheduler con APScheduler")
     print("🕒 Tareas programadas:")
     print(f"   - Extracción cada {EXTRACTION_INTERVAL} segundos")
-    print(f"   - Entrenamiento cada {TRAINING_INTERVAL} segundos")
+    if SCHEDULER_MODE == "events":
+        print("   - Rescoring y entrenamiento disparados por nuevos datos (SCHEDULER_MODE=events)")
+    else:
+        print(f"   - Entrenamiento cada {TRAINING_INTERVAL} segundos")
+    if TUNING_INTERVAL > 0:
+        print(f"   - Búsqueda de hiperparámetros cada {TUNING_INTERVAL} segundos")
     print("========================================\n")
 
+    event_pipeline = start_event_pipeline() if SCHEDULER_MODE == "events" else None
     scheduler.start()
     time.sleep(2)  # Pequeña pausa para asegurarnos de que las tareas se programan
 
@@ -57,27 +95,36 @@ if __name__ == "__main__":
     job_extraction = scheduler.get_job("extraction")
     job_training = scheduler.get_job("training")
 
-    if not job_extraction or not job_training:
+    if not job_extraction or (SCHEDULER_MODE == "interval" and not job_training):
         print("❌ Error: No se programaron correctamente las tareas en el scheduler.")
         exit(1)
 
     print(f"✅ Próxima ejecución de extracción: {job_extraction.next_run_time}")
-    print(f"✅ Próxima ejecución de entrenamiento: {job_training.next_run_time}\n")
+    if job_training:
+        print(f"✅ Próxima ejecución de entrenamiento: {job_training.next_run_time}\n")
 
     try:
         while True:
             now = datetime.datetime.now(datetime.timezone.utc)  # Tiempo actual en UTC
 
             next_run_extraction = job_extraction.next_run_time
-            next_run_training = job_training.next_run_time
+            next_run_training = job_training.next_run_time if job_training else None
 
             remaining_extraction = (next_run_extraction - now).total_seconds() if next_run_extraction else "N/A"
             remaining_training = (next_run_training - now).total_seconds() if next_run_training else "N/A"
 
-            print(f"⏳ Próxima extracción en {int(remaining_extraction)}s | Próximo entrenamiento en {int(remaining_training)}s")
+            if job_training:
+                print(f"⏳ Próxima extracción en {int(remaining_extraction)}s | Próximo entrenamiento en {int(remaining_training)}s")
+            else:
+                print(f"⏳ Próxima extracción en {int(remaining_extraction)}s | Entrenamiento por eventos")
+                if event_pipeline.poll() is not None:
+                    print(f"❌ El pipeline por eventos terminó (código {event_pipeline.returncode}), reiniciando...")
+                    event_pipeline = start_event_pipeline()
 
             time.sleep(60)  # Muestra información cada minuto
 
     except (KeyboardInterrupt, SystemExit):
         print("\n🛑 Deteniendo el scheduler...")
         scheduler.shutdown()
+        if event_pipeline:
+            event_pipeline.terminate()
@@ -0,0 +1,172 @@
+import os
+import asyncio
+from starlette.responses import JSONResponse
+
+# Configuración del control de admisión
+ADMISSION_CONTROL = os.getenv("ADMISSION_CONTROL", "true").lower() == "true"
+ADMISSION_PATHS = [path for path in os.getenv("ADMISSION_PATHS", "/predict/").split(",") if path]
+ADMISSION_MAX_INFLIGHT = int(os.getenv("ADMISSION_MAX_INFLIGHT", 8))  # Peticiones ejecutándose a la vez
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", 32))  # Peticiones esperando turno; el resto se rechaza
+ADMISSION_TIMEOUT_SECONDS = float(os.getenv("ADMISSION_TIMEOUT_SECONDS", 1.0))  # Plazo por petición (cola + ejecución)
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", 1))  # Segundos sugeridos al cliente en Retry-After
+ADMISSION_MAX_LOOP_LAG_MS = float(os.getenv("ADMISSION_MAX_LOOP_LAG_MS", 100))  # Retraso del event loop a partir del que se rechaza
+LOOP_LAG_INTERVAL = 0.05  # Segundos entre mediciones del retraso del event loop
+
+# Cabecera con la que un cliente puede acortar su plazo (en milisegundos)
+DEADLINE_HEADER = b"x-request-timeout-ms"
+
+
+class AdmissionController:
+    """
+    Limita las peticiones costosas en vez de encolarlas sin límite en el threadpool.
+
+    - Como máximo ADMISSION_MAX_INFLIGHT peticiones se ejecutan a la vez y ADMISSION_MAX_QUEUE esperan turno.
+    - Con la cola llena se responde 503 con Retry-After al instante, sin consumir un hilo.
+    - Cada petición tiene un plazo (ADMISSION_TIMEOUT_SECONDS o la cabecera X-Request-Timeout-Ms, el menor):
+      si se agota esperando turno se responde 503 y si se agota ejecutándose, 504.
+    - Si el event loop va con más de ADMISSION_MAX_LOOP_LAG_MS de retraso (CPU saturada parseando peticiones),
+      la cola está en el propio loop y no en el threadpool: también se rechaza con 503.
+    """
+
+    def __init__(self, paths=ADMISSION_PATHS, max_inflight=ADMISSION_MAX_INFLIGHT, max_queue=ADMISSION_MAX_QUEUE,
+                 timeout=ADMISSION_TIMEOUT_SECONDS, enabled=ADMISSION_CONTROL):
+        self.paths = tuple(paths)
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.enabled = enabled
+        self.semaphore = None  # Se crea dentro del event loop del servidor
+        self.lag_monitor = None
+        self.loop_lag = 0.0
+        self.inflight = 0
+        self.waiting = 0
+        self.stats = {"admitted": 0, "shed_queue_full": 0, "shed_loop_lag": 0, "shed_deadline": 0, "timed_out": 0}
+
+    def applies_to(self, scope):
+        return self.enabled and scope["type"] == "http" and scope["path"].startswith(self.paths)
+
+    def saturated(self):
+        """La cola está llena o el event loop va retrasado: las nuevas peticiones se rechazarían."""
+        return self.enabled and (self.inflight >= self.max_inflight and self.waiting >= self.max_queue
+                                 or self.loop_lag * 1000 > ADMISSION_MAX_LOOP_LAG_MS)
+
+    async def _measure_loop_lag(self):
+        """Mide cuánto tarda en despertar un sleep corto: es el tiempo que espera cualquier tarea lista en el loop."""
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(LOOP_LAG_INTERVAL)
+            self.loop_lag = max(0.0, loop.time() - start - LOOP_LAG_INTERVAL)
+
+    def deadline(self, scope):
+        timeout = self.timeout
+        for name, value in scope.get("headers", []):
+            if name == DEADLINE_HEADER:
+                try:
+                    timeout = min(timeout, float(value) / 1000)
+                except ValueError:
+                    pass
+        return asyncio.get_running_loop().time() + timeout
+
+    async def acquire(self, deadline):
+        """Espera turno hasta el plazo. Devuelve None si se admite o el motivo del rechazo."""
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.max_inflight)
+            self.lag_monitor = asyncio.get_running_loop().create_task(self._measure_loop_lag())
+        if self.loop_lag * 1000 > ADMISSION_MAX_LOOP_LAG_MS:
+            return "shed_loop_lag"
+        if self.inflight >= self.max_inflight and self.waiting >= self.max_queue:
+            return "shed_queue_full"
+
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self.semaphore.acquire(), max(0.0, deadline - asyncio.get_running_loop().time()))
+        except asyncio.TimeoutError:
+            return "shed_deadline"
+        finally:
+            self.waiting -= 1
+
+        self.inflight += 1
+        self.stats["admitted"] += 1
+        return None
+
+    def release(self):
+        self.inflight -= 1
+        self.semaphore.release()
+
+    def status(self):
+        return {"enabled": self.enabled, "inflight": self.inflight, "waiting": self.waiting,
+                "loop_lag_ms": round(self.loop_lag * 1000, 1),
+                "max_inflight": self.max_inflight, "max_queue": self.max_queue, **self.stats}
+
+    def format_prometheus(self):
+        """Exporta el estado de la cola y los contadores de rechazo en formato Prometheus."""
+        lines = ["# TYPE energy_admission_inflight gauge", f"energy_admission_inflight {self.inflight}",
+                 "# TYPE energy_admission_waiting gauge", f"energy_admission_waiting {self.waiting}",
+                 "# TYPE energy_admission_loop_lag_seconds gauge", f"energy_admission_loop_lag_seconds {self.loop_lag:.4f}",
+                 "# TYPE energy_admission_requests_total counter"]
+        lines += [f'energy_admission_requests_total{{outcome="{name}"}} {value}' for name, value in self.stats.items()]
+        return "\n".join(lines) + "\n"
+
+
+REJECTIONS = {
+    "shed_queue_full": (503, "Servicio saturado, reintenta más tarde."),
+    "shed_loop_lag": (503, "Servicio saturado, reintenta más tarde."),
+    "shed_deadline": (503, "Plazo agotado esperando turno."),
+    "timed_out": (504, "Plazo agotado procesando la petición."),
+}
+
+
+class AdmissionMiddleware:
+    """Middleware ASGI que aplica un AdmissionController; las rutas fuera de sus `paths` pasan sin esperar."""
+
+    def __init__(self, app, controller):
+        self.app = app
+        self.controller = controller
+
+    async def reject(self, scope, receive, send, reason):
+        self.controller.stats[reason] += 1
+        status_code, detail = REJECTIONS[reason]
+        headers = {"Retry-After": str(ADMISSION_RETRY_AFTER)} if status_code == 503 else None
+        await JSONResponse({"detail": detail}, status_code=status_code, headers=headers)(scope, receive, send)
+
+    async def __call__(self, scope, receive, send):
+        if not self.controller.applies_to(scope):
+            await self.app(scope, receive, send)
+            return
+
+        deadline = self.controller.deadline(scope)
+        reason = await self.controller.acquire(deadline)
+        if reason:
+            await self.reject(scope, receive, send, reason)
+            return
+
+        started = False
+        timed_out = False
+
+        async def send_wrapper(message):
+            nonlocal started
+            if timed_out:
+                return  # Ya se respondió 504: la respuesta tardía del handler se descarta
+            started = started or message["type"] == "http.response.start"
+            await send(message)
+
+        # Cancelar la corrutina no para un handler síncrono que ya corre en el threadpool, así que la petición
+        # se ejecuta como tarea sin cancelarla y el turno se libera cuando termina de verdad, no al vencer el plazo.
+        task = asyncio.ensure_future(self.app(scope, receive, send_wrapper))
+        task.add_done_callback(self._finished)
+
+        remaining = max(0.0, deadline - asyncio.get_running_loop().time())
+        done, _ = await asyncio.wait({task}, timeout=remaining)
+        if task in done:
+            task.result()  # Propaga las excepciones del handler
+        elif started:
+            await asyncio.shield(task)  # La respuesta ya empezó: no se puede cambiar por un 504
+        else:
+            timed_out = True
+            await self.reject(scope, receive, send, "timed_out")
+
+    def _finished(self, task):
+        self.controller.release()
+        if not task.cancelled():
+            task.exception()  # Marca la excepción como recuperada si nadie esperaba ya a la tarea
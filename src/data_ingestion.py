@@ -5,6 +5,8 @@ from pymongo import MongoClient
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 from web_scrapper import navigate_and_extract
+from price_ingestion import transform_prices, write_prices
+from ingestion_pipeline import run_pipeline
 
 # Cargar variables desde .env
 load_dotenv()
@@ -41,44 +43,18 @@ else:
 
 END_DATE = datetime.today().strftime("%Y-%m-%d")
 
-def store_prices_in_mongo(data):
-    """Almacena los datos en MongoDB evitando duplicados."""
-    if data and "unix_seconds" in data and "price" in data and "unit" in data:
-        timestamps = data["unix_seconds"]
-        prices = data["price"]
-        currency = data["unit"]
-
-        if len(timestamps) != len(prices):
-            log_message(f"Error: Desajuste entre timestamps ({len(timestamps)}) y precios ({len(prices)}).")
-            return
-
-        processed_data = []
-        for ts, price in zip(timestamps, prices):
-            record = {
-                "timestamp": datetime.utcfromtimestamp(ts),
-                "price": price,
-                "currency": currency,
-                "country": COUNTRY,
-                "bidding_zone": BIDDING_ZONE
-            }
-
-            # Evitar duplicados
-            if not collection.find_one({"timestamp": record["timestamp"], "bidding_zone": BIDDING_ZONE}):
-                processed_data.append(record)
-
-        if processed_data:
-            collection.insert_many(processed_data)
-            log_message(f"Datos insertados correctamente ({len(processed_data)} registros).")
-        else:
-            log_message("No hay datos nuevos para insertar.")
-    else:
-        log_message("Estructura de datos inesperada. No se insertaron registros.")
+def fetch_prices(window):
+    """Descarga una ventana (inicio, fin) con el web scraper."""
+    start_str, end_str = window
+    return navigate_and_extract(BIDDING_ZONE, start_str, end_str) or None
 
 if __name__ == "__main__":
     log_message(f"Descargando datos diarios para {COUNTRY} ({BIDDING_ZONE}) desde {START_DATE} hasta {END_DATE}...")
 
-    # **Usar el Web Scraper en lugar de la API directa**
-    energy_prices = navigate_and_extract(BIDDING_ZONE, START_DATE, END_DATE)
-
-    store_prices_in_mongo(energy_prices)
+    # **Usar el Web Scraper en lugar de la API directa**, con las mismas etapas que la ingesta histórica
+    run_pipeline("energy-daily", [(START_DATE, END_DATE)], [
+        ("fetch", fetch_prices),
+        ("transform", transform_prices),
+        ("write", write_prices),
+    ])
     log_message("Descarga diaria completada.")
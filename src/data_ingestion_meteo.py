@@ -6,6 +6,8 @@ from dotenv import load_dotenv
 from pymongo import MongoClient
 
 from historical_data_ingestion_meteo import fetch_historical_weather_data, transform_weather_data
+from drift_monitor import update_feature_stats
+from ingestion_pipeline import run_pipeline
 
 # Cargar configuración desde .env
 load_dotenv()
@@ -35,32 +37,39 @@ def log_message(message):
     logging.info(message)
     print(message)
 
-def fetch_daily_weather_data():
-    """Solicita los datos del día anterior a Open-Meteo."""
-    start_date = (datetime.today() - timedelta(days=1)).strftime("%Y-%m-%d")
-    return fetch_historical_weather_data(start_date, start_date)
-
 def load_weather_data_filtered(data):
     """Carga datos en MongoDB solo si no existen."""
-    inserted_count = 0
-    for record in data:
-        existing_entry = collection.find_one({"timestamp": record["timestamp"]})
-        if not existing_entry:
-            collection.insert_one(record)
-            inserted_count += 1
+    # Una sola consulta para saber qué timestamps ya existen
+    existing = {doc["timestamp"] for doc in collection.find(
+        {"timestamp": {"$in": [record["timestamp"] for record in data]}}, {"_id": 0, "timestamp": 1})} if data else set()
+    inserted = [record for record in data if record["timestamp"] not in existing]
+    if inserted:
+        collection.insert_many(inserted)
 
+    inserted_count = len(inserted)
+    update_feature_stats(inserted)
     if inserted_count > 0:
         log_message(f"✅ {inserted_count} registros nuevos insertados en MongoDB.")
     else:
         log_message("⚠️ No se insertaron datos. Todos los registros ya existían.")
+    return inserted_count
+
+def fetch_weather_window(window):
+    """Solicita a Open-Meteo los datos de una ventana (inicio, fin)."""
+    start_str, end_str = window
+    data = fetch_historical_weather_data(start_str, end_str)
+    if not data:
+        log_message("⚠️ No se obtuvieron datos meteorológicos hoy.")
+    return data or None
 
 if __name__ == "__main__":
     log_message("📡 Descargando datos meteorológicos diarios...")
 
-    data = fetch_daily_weather_data()
-    if data:
-        transformed_data = transform_weather_data(data)
-        load_weather_data_filtered(transformed_data)
-        log_message("📡 Descarga diaria completada.")
-    else:
-        log_message("⚠️ No se obtuvieron datos meteorológicos hoy.")
+    # Datos del día anterior, con las mismas etapas que la ingesta histórica
+    yesterday = (datetime.today() - timedelta(days=1)).strftime("%Y-%m-%d")
+    run_pipeline("meteo-daily", [(yesterday, yesterday)], [
+        ("fetch", fetch_weather_window),
+        ("transform", transform_weather_data),
+        ("write", load_weather_data_filtered),
+    ])
+    log_message("📡 Descarga diaria completada.")
@@ -0,0 +1,219 @@
+import os
+import logging
+from datetime import datetime
+import numpy as np
+from dotenv import load_dotenv
+from pymongo import MongoClient, ASCENDING, UpdateOne
+
+# Cargar configuración desde .env
+load_dotenv()
+
+# Configuración de MongoDB
+MONGO_URI = os.getenv("MONGO_URI")
+MONGO_DB = os.getenv("MONGO_DB")
+MONGO_COLLECTION_QUARANTINE = os.getenv("MONGO_COLLECTION_QUARANTINE", "quarantine")
+
+# Umbrales de validación
+PRICE_MIN = float(os.getenv("VALIDATION_PRICE_MIN", -500))  # Límites armonizados del mercado diario europeo
+PRICE_MAX = float(os.getenv("VALIDATION_PRICE_MAX", 4000))
+SPIKE_ZSCORE = float(os.getenv("VALIDATION_SPIKE_ZSCORE", 12))  # Z-score robusto a partir del cual un punto aislado es un pico
+QUARANTINE_MAX_ATTEMPTS = int(os.getenv("QUARANTINE_MAX_ATTEMPTS", 5))  # Descargas con nulos antes de dar un slot por perdido
+
+# Motivos deterministas: volver a descargar el slot devolvería el mismo valor. Los nulos no lo son
+# (Open-Meteo devuelve nulos en los días más recientes hasta que el archivo se completa).
+DETERMINISTIC_REASONS = ["spike", "out_of_range", "duplicate"]
+
+# Rangos físicamente posibles de cada variable de Open-Meteo
+WEATHER_RANGES = {
+    "temperature_2m": (-60, 60),
+    "relative_humidity_2m": (0, 100),
+    "precipitation": (0, 500),
+    "rain": (0, 500),
+    "snowfall": (0, 200),
+    "surface_pressure": (850, 1100),
+    "cloud_cover": (0, 100),
+    "wind_speed_10m": (0, 300),
+    "wind_speed_100m": (0, 400),
+    "wind_direction_10m": (0, 360),
+    "wind_direction_100m": (0, 360),
+}
+
+# Variables en las que se buscan picos aislados y salto mínimo (en sus unidades) para considerarlo pico
+SPIKE_MIN_JUMP = {"price": 200.0, "temperature_2m": 15.0, "surface_pressure": 30.0}
+
+# Conectar a MongoDB
+client = MongoClient(MONGO_URI)
+db = client[MONGO_DB]
+collection_quarantine = db[MONGO_COLLECTION_QUARANTINE]
+_indexes_ready = False
+
+
+def log_message(message):
+    """Registrar mensaje en log y consola"""
+    logging.info(message)
+    print(message)
+
+
+def detect_spikes(values, min_jump):
+    """
+    Marca puntos aislados que se alejan de la media de sus dos vecinos.
+
+    El residuo se normaliza con la MAD de todos los residuos (z-score robusto), así que un día volátil
+    completo no se marca; solo el valor que salta y vuelve.
+    """
+    spikes = np.zeros(len(values), dtype=bool)
+    if len(values) < 3:
+        return spikes
+    residual = values[1:-1] - (values[:-2] + values[2:]) / 2
+    finite = residual[np.isfinite(residual)]
+    if not finite.size:
+        return spikes
+    mad = np.median(np.abs(finite - np.median(finite))) * 1.4826
+    magnitude = np.abs(residual)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        zscore = magnitude / mad
+    # Los vecinos de un pico también tienen residuo alto (la mitad); solo se marca el máximo local
+    padded = np.concatenate(([0.0], np.nan_to_num(magnitude), [0.0]))
+    local_max = padded[1:-1] >= np.maximum(padded[:-2], padded[2:])
+    spikes[1:-1] = (zscore > SPIKE_ZSCORE) & (magnitude > min_jump) & local_max
+    return spikes
+
+
+def validate_columns(timestamps, columns, ranges):
+    """
+    Valida un payload columnar de una vez y devuelve (máscara de filas válidas, motivos de rechazo).
+
+    `motivos` es un dict nombre → máscara booleana: null, out_of_range, duplicate, out_of_order, spike.
+    """
+    n = len(timestamps)
+    reasons = {name: np.zeros(n, dtype=bool) for name in ["null", "out_of_range", "duplicate", "out_of_order", "spike"]}
+
+    for name, values in columns.items():
+        reasons["null"] |= np.isnan(values)
+        if name in ranges:
+            low, high = ranges[name]
+            reasons["out_of_range"] |= (values < low) | (values > high)
+        if name in SPIKE_MIN_JUMP:
+            reasons["spike"] |= detect_spikes(values, SPIKE_MIN_JUMP[name])
+
+    # Duplicados: se conserva la primera aparición de cada timestamp
+    _, first_index = np.unique(timestamps, return_index=True)
+    reasons["duplicate"][:] = True
+    reasons["duplicate"][first_index] = False
+
+    # Orden: un timestamp anterior a alguno ya visto rompe la monotonía
+    if n > 1:
+        running_max = np.maximum.accumulate(timestamps)
+        reasons["out_of_order"][1:] = timestamps[1:] < running_max[:-1]
+
+    rejected = np.zeros(n, dtype=bool)
+    for mask in reasons.values():
+        rejected |= mask
+    return ~rejected, reasons
+
+
+def ensure_indexes():
+    """Índice único (fuente, timestamp) de la cuarentena; los payloads completos no tienen timestamp y quedan fuera."""
+    global _indexes_ready
+    if _indexes_ready:
+        return
+    collection_quarantine.create_index([("source", ASCENDING), ("timestamp", ASCENDING)], unique=True,
+                                       partialFilterExpression={"timestamp": {"$exists": True}})
+    _indexes_ready = True
+
+
+def quarantine_rows(source, timestamps, columns, valid, reasons):
+    """
+    Guarda las filas rechazadas en la colección de cuarentena con sus motivos.
+
+    Se hace upsert por (fuente, timestamp): si la misma ventana se vuelve a descargar y a rechazar, se actualiza
+    el registro y se incrementa `occurrences` en vez de duplicarlo. El gap filler trata como conocidos los
+    slots rechazados por motivos deterministas (ver settled_quarantine_query).
+    """
+    rejected = np.flatnonzero(~valid)
+    if not rejected.size:
+        return 0
+
+    ensure_indexes()
+    now = datetime.utcnow()
+    docs = []
+    for i in rejected:
+        docs.append(UpdateOne(
+            {"source": source, "timestamp": timestamps[i].astype("datetime64[ms]").item()},
+            {"$set": {"values": {name: (None if np.isnan(values[i]) else float(values[i]))
+                                 for name, values in columns.items()},
+                      "reasons": [name for name, mask in reasons.items() if mask[i]],
+                      "quarantined_at": now},
+             "$setOnInsert": {"first_quarantined_at": now},
+             "$inc": {"occurrences": 1}},
+            upsert=True))
+    collection_quarantine.bulk_write(docs, ordered=False)
+    log_message(f"🚧 [{source}] {len(docs)} registros enviados a cuarentena: "
+                + ", ".join(f"{name}={int(mask.sum())}" for name, mask in reasons.items() if mask.any()))
+    return len(docs)
+
+
+def release_quarantine(source, timestamps):
+    """Borra de la cuarentena los slots que una descarga posterior ha validado (p. ej. nulos ya completados)."""
+    if len(timestamps):
+        collection_quarantine.delete_many({"source": source,
+                                           "timestamp": {"$in": timestamps.astype("datetime64[ms]").tolist()}})
+
+
+def settled_quarantine_query(source, start, end):
+    """
+    Filtro de los slots en cuarentena que el gap filler debe dar por conocidos en [start, end): los rechazados
+    por un motivo determinista y los que siguen con nulos tras QUARANTINE_MAX_ATTEMPTS descargas.
+    """
+    return {"source": source, "timestamp": {"$gte": start, "$lt": end},
+            "$or": [{"reasons": {"$in": DETERMINISTIC_REASONS}}, {"occurrences": {"$gte": QUARANTINE_MAX_ATTEMPTS}}]}
+
+
+def quarantine_payload(source, reason, details):
+    """Guarda en cuarentena un payload completo que no se puede validar fila a fila."""
+    collection_quarantine.insert_one({"source": source, "reasons": [reason], "details": details,
+                                      "quarantined_at": datetime.utcnow()})
+    log_message(f"🚧 [{source}] Payload completo enviado a cuarentena: {reason} {details}")
+
+
+def validate_price_payload(data, source="energy"):
+    """
+    Valida la respuesta de energy-charts y devuelve (unix_seconds, prices) solo con las filas válidas.
+
+    Devuelve None si los arrays de timestamps y precios no tienen la misma longitud.
+    """
+    timestamps, prices = data["unix_seconds"], data["price"]
+    if len(timestamps) != len(prices):
+        quarantine_payload(source, "length_mismatch", {"unix_seconds": len(timestamps), "price": len(prices)})
+        return None
+
+    unix_seconds = np.asarray(timestamps, dtype=np.int64)
+    columns = {"price": np.asarray(prices, dtype=np.float64)}
+    valid, reasons = validate_columns(unix_seconds, columns, {"price": (PRICE_MIN, PRICE_MAX)})
+    quarantine_rows(source, unix_seconds.astype("datetime64[s]"), columns, valid, reasons)
+    release_quarantine(source, unix_seconds[valid].astype("datetime64[s]"))
+    return unix_seconds[valid].tolist(), columns["price"][valid].tolist()
+
+
+def validate_weather_payload(data, source="meteo"):
+    """
+    Valida la respuesta horaria de Open-Meteo y devuelve el mismo payload solo con las filas válidas.
+
+    Devuelve None si las variables no tienen la misma longitud que `time`.
+    """
+    hourly = data.get("hourly", {})
+    times = hourly.get("time", [])
+    lengths = {name: len(hourly[name]) for name in WEATHER_RANGES if name in hourly}
+    if any(length != len(times) for length in lengths.values()):
+        quarantine_payload(source, "length_mismatch", dict(lengths, time=len(times)))
+        return None
+
+    timestamps = np.asarray(times, dtype="datetime64[m]")
+    columns = {name: np.asarray(hourly[name], dtype=np.float64) for name in lengths}
+    valid, reasons = validate_columns(timestamps, columns, WEATHER_RANGES)
+    quarantine_rows(source, timestamps, columns, valid, reasons)
+    release_quarantine(source, timestamps[valid])
+
+    filtered = {name: np.asarray(values, dtype=object)[valid].tolist() for name, values in hourly.items()
+                if isinstance(values, list) and len(values) == len(times)}
+    return dict(data, hourly=dict(hourly, **filtered))
@@ -0,0 +1,276 @@
+import os
+import sys
+import json
+import logging
+import argparse
+from datetime import datetime, timedelta
+import numpy as np
+from dotenv import load_dotenv
+from pymongo import MongoClient
+
+# Cargar configuración desde .env
+load_dotenv()
+
+# Configuración de MongoDB
+MONGO_URI = os.getenv("MONGO_URI")
+MONGO_DB = os.getenv("MONGO_DB")
+MONGO_COLLECTION_PREDICTIONS = os.getenv("MONGO_COLLECTION_PREDICTIONS", "price_predictions")
+MONGO_COLLECTION_MONITORING = os.getenv("MONGO_COLLECTION_MONITORING", "monitoring_state")
+
+# Umbrales de deriva
+DRIFT_MEAN_SHIFT = float(os.getenv("DRIFT_MEAN_SHIFT", 1.0))  # Desplazamiento de la media en desviaciones típicas de referencia
+DRIFT_PSI = float(os.getenv("DRIFT_PSI", 0.2))  # Population Stability Index máximo por variable
+DRIFT_MAE_RATIO = float(os.getenv("DRIFT_MAE_RATIO", 1.5))  # MAE móvil / MAE del modelo
+DRIFT_CONFIRM_MAE_RATIO = float(os.getenv("DRIFT_CONFIRM_MAE_RATIO", 1.25))  # MAE móvil / MAE del modelo que confirma una deriva de variables
+DRIFT_MIN_SAMPLES = int(os.getenv("DRIFT_MIN_SAMPLES", 168))  # Observaciones mínimas antes de evaluar (una semana horaria)
+DRIFT_ERROR_WINDOW = int(os.getenv("DRIFT_ERROR_WINDOW", 168))  # Errores recientes usados para el MAE móvil
+DRIFT_MAX_MODEL_AGE_DAYS = int(os.getenv("DRIFT_MAX_MODEL_AGE_DAYS", 30))  # Reentrenar igualmente pasado este tiempo
+HISTOGRAM_BINS = 10
+
+# Código de salida de `check` cuando hay que reentrenar
+EXIT_RETRAIN = 10
+
+# Conectar a MongoDB
+client = MongoClient(MONGO_URI)
+db = client[MONGO_DB]
+collection_predictions = db[MONGO_COLLECTION_PREDICTIONS]
+collection_monitoring = db[MONGO_COLLECTION_MONITORING]
+
+STATE_ID = "drift"
+
+
+def log_message(message):
+    """Registrar mensaje en log y consola"""
+    logging.info(message)
+    print(message)
+
+
+def reference_stats(X, features, timestamps=None):
+    """
+    Estadísticas de referencia de cada variable de entrenamiento: media, desviación e histograma por cuantiles.
+
+    Con `timestamps` se guardan además por mes del año ("monthly"), sobre los mismos bins, para comparar
+    los datos nuevos con la misma época del año y no con la distribución de todo el año.
+    """
+    months = None if timestamps is None else np.asarray(timestamps, dtype="datetime64[M]").astype(np.int64) % 12 + 1
+    stats = {}
+    for i, name in enumerate(features):
+        if name == "days_since_start":
+            continue
+        values = X[:, i].astype(np.float64)
+        edges = np.unique(np.quantile(values, np.linspace(0, 1, HISTOGRAM_BINS + 1)[1:-1]))
+        bins = np.searchsorted(edges, values, side="right")
+        counts = np.bincount(bins, minlength=len(edges) + 1)
+        stats[name] = {"mean": float(values.mean()), "std": float(values.std()), "edges": edges.tolist(),
+                       "proportions": (counts / counts.sum()).tolist()}
+        if months is not None:
+            monthly = {}
+            for month in np.unique(months):
+                in_month = months == month
+                month_counts = np.bincount(bins[in_month], minlength=len(edges) + 1)
+                monthly[str(month)] = {"mean": float(values[in_month].mean()), "std": float(values[in_month].std()),
+                                       "proportions": (month_counts / month_counts.sum()).tolist()}
+            stats[name]["monthly"] = monthly
+    return stats
+
+
+def seasonal_reference(ref, month_counts):
+    """
+    Referencia ajustada a la época observada: mezcla de las referencias mensuales ponderada por cuántas
+    observaciones nuevas hay de cada mes. Sin referencias mensuales (modelos anteriores) se usa la anual.
+    """
+    monthly = ref.get("monthly")
+    weights = {month: n for month, n in (month_counts or {}).items() if monthly and month in monthly and n}
+    if not weights:
+        return ref
+    total = sum(weights.values())
+    mean = sum(n * monthly[month]["mean"] for month, n in weights.items()) / total
+    # Varianza de la mezcla: media de (varianza + media²) de cada mes menos la media global al cuadrado
+    second_moment = sum(n * (monthly[month]["std"] ** 2 + monthly[month]["mean"] ** 2) for month, n in weights.items()) / total
+    proportions = sum(n * np.asarray(monthly[month]["proportions"]) for month, n in weights.items()) / total
+    return {"mean": mean, "std": max(second_moment - mean ** 2, 0.0) ** 0.5, "proportions": proportions.tolist()}
+
+
+def merge_welford(state, values, edges):
+    """Combina un lote de valores con el estado (n, mean, m2, hist) usando la fórmula paralela de Welford."""
+    n_b = len(values)
+    if not n_b:
+        return state
+    mean_b = values.mean()
+    m2_b = ((values - mean_b) ** 2).sum()
+    n_a, mean_a, m2_a = state["n"], state["mean"], state["m2"]
+    n = n_a + n_b
+    delta = mean_b - mean_a
+
+    hist = np.bincount(np.searchsorted(edges, values, side="right"), minlength=len(edges) + 1)
+    return {"n": n, "mean": mean_a + delta * n_b / n, "m2": m2_a + m2_b + delta ** 2 * n_a * n_b / n,
+            "hist": (np.asarray(state["hist"]) + hist).tolist()}
+
+
+def _current_model():
+    from model_registry import load_metadata
+    return load_metadata()
+
+
+def _load_state(metadata, save=True):
+    """
+    Estado de monitorización de la versión actual del modelo (se reinicia con cada versión nueva).
+
+    Con `save=False` (lecturas como GET /metrics) el estado reiniciado se devuelve sin escribirlo.
+    """
+    state = collection_monitoring.find_one({"_id": STATE_ID})
+    if state is None or state.get("model_version") != metadata["version"]:
+        state = {"_id": STATE_ID, "model_version": metadata["version"], "errors": [],
+                 "features": {name: {"n": 0, "mean": 0.0, "m2": 0.0, "hist": [0] * (len(ref["edges"]) + 1), "months": {}}
+                              for name, ref in metadata.get("feature_stats", {}).items()}}
+        if save:
+            collection_monitoring.replace_one({"_id": STATE_ID}, state, upsert=True)
+    return state
+
+
+def _after_training(records, metadata):
+    """
+    Solo los registros posteriores a la ventana de entrenamiento son "datos nuevos" para el modelo: los
+    rellenos históricos (ingesta histórica, gap filler) no deben entrar en las estadísticas en streaming.
+    """
+    end = metadata.get("training_window", {}).get("end")
+    if end is None:
+        return records
+    end = datetime.fromisoformat(end)
+    return [record for record in records if record.get("timestamp") is not None and record["timestamp"] > end]
+
+
+def update_feature_stats(records):
+    """Actualiza las estadísticas en streaming con registros meteorológicos recién insertados."""
+    metadata = _current_model()
+    if not records or metadata is None or "feature_stats" not in metadata:
+        return
+    records = _after_training(records, metadata)
+    if not records:
+        return
+    state = _load_state(metadata)
+
+    months = np.array([record["timestamp"].month if record.get("timestamp") else 0 for record in records])
+    features = {}
+    for name, ref in metadata["feature_stats"].items():
+        values = np.array([record.get(name) for record in records], dtype=np.float64)
+        valid = ~np.isnan(values)
+        current = state["features"][name]
+        features[name] = merge_welford(current, values[valid], np.asarray(ref["edges"]))
+        # Observaciones por mes del año, para comparar con la referencia de la misma época
+        month_counts = dict(current.get("months", {}))
+        for month, n in zip(*np.unique(months[valid & (months > 0)], return_counts=True)):
+            month_counts[str(month)] = month_counts.get(str(month), 0) + int(n)
+        features[name]["months"] = month_counts
+
+    collection_monitoring.update_one({"_id": STATE_ID, "model_version": metadata["version"]}, {"$set": {"features": features}})
+
+
+def update_prediction_errors(records):
+    """Añade al MAE móvil el error absoluto de las predicciones para los precios reales recién insertados."""
+    metadata = _current_model()
+    records = [record for record in records if record.get("price") is not None]
+    if not records or metadata is None:
+        return
+    records = _after_training(records, metadata)
+    if not records:
+        return
+    _load_state(metadata)
+
+    timestamps = [record["timestamp"] for record in records]
+    query = {"timestamp": {"$in": timestamps}}
+    predicted = {doc["timestamp"]: doc["predicted_price"] for doc in collection_predictions.find(query)}
+    if len(predicted) < len(timestamps):
+        # Puntuar en el momento las horas que aún no tienen predicción
+        from forecast_scoring import score_range
+        score_range(min(timestamps), max(timestamps) + timedelta(hours=1))
+        predicted = {doc["timestamp"]: doc["predicted_price"] for doc in collection_predictions.find(query)}
+
+    errors = [abs(record["price"] - predicted[record["timestamp"]]) for record in records if record["timestamp"] in predicted]
+    if errors:
+        collection_monitoring.update_one({"_id": STATE_ID, "model_version": metadata["version"]},
+                                         {"$push": {"errors": {"$each": errors, "$slice": -DRIFT_ERROR_WINDOW}}})
+
+
+def population_stability_index(expected, actual_counts):
+    """PSI entre las proporciones de referencia y los recuentos observados."""
+    expected = np.clip(np.asarray(expected, dtype=np.float64), 1e-4, None)
+    actual = np.clip(np.asarray(actual_counts, dtype=np.float64) / max(sum(actual_counts), 1), 1e-4, None)
+    return float(((actual - expected) * np.log(actual / expected)).sum())
+
+
+def check_drift(save=True):
+    """Compara las estadísticas en streaming con las del modelo y decide si hay que reentrenar."""
+    metadata = _current_model()
+    if metadata is None:
+        return {"retrain": True, "reasons": ["no_model"], "features": {}}
+
+    state = _load_state(metadata, save)
+    reasons, features, drifted = [], {}, []
+
+    for name, ref in metadata.get("feature_stats", {}).items():
+        current = state["features"].get(name)
+        if not current or current["n"] < DRIFT_MIN_SAMPLES:
+            continue
+        expected = seasonal_reference(ref, current.get("months"))
+        mean_shift = abs(current["mean"] - expected["mean"]) / (expected["std"] or 1.0)
+        psi = population_stability_index(expected["proportions"], current["hist"])
+        features[name] = {"n": current["n"], "mean": current["mean"], "std": (current["m2"] / current["n"]) ** 0.5,
+                          "mean_shift": mean_shift, "psi": psi}
+        if mean_shift > DRIFT_MEAN_SHIFT or psi > DRIFT_PSI:
+            drifted.append(name)
+
+    errors = state.get("errors", [])
+    rolling_mae = float(np.mean(errors)) if errors else None
+    mae_ratio = rolling_mae / metadata["mae"] if rolling_mae is not None and metadata.get("mae") else None
+    enough_errors = mae_ratio is not None and len(errors) >= DRIFT_MIN_SAMPLES
+    if enough_errors and mae_ratio > DRIFT_MAE_RATIO:
+        reasons.append("prediction_error")
+
+    # Una semana de tiempo meteorológico casi nunca reproduce la distribución de su mes, así que la deriva de
+    # variables por sí sola no reentrena: solo cuenta si el error del modelo también ha empeorado
+    if drifted and enough_errors and mae_ratio > DRIFT_CONFIRM_MAE_RATIO:
+        reasons += [f"feature_drift:{name}" for name in drifted]
+
+    model_age_days = (datetime.utcnow() - datetime.fromisoformat(metadata["created_at"])).total_seconds() / 86400
+    if model_age_days > DRIFT_MAX_MODEL_AGE_DAYS:
+        reasons.append("model_age")
+
+    metrics = {"model_version": metadata["version"], "model_age_days": model_age_days, "model_mae": metadata.get("mae"),
+               "rolling_mae": rolling_mae, "mae_ratio": mae_ratio, "error_samples": len(errors),
+               "features": features, "drifted_features": drifted, "retrain": bool(reasons), "reasons": reasons,
+               "checked_at": datetime.utcnow().isoformat()}
+    if save:
+        collection_monitoring.update_one({"_id": STATE_ID}, {"$set": {"last_check": metrics}})
+    return metrics
+
+
+def format_prometheus(metrics):
+    """Exporta las métricas de deriva en formato de exposición de Prometheus."""
+    lines = [
+        "# TYPE energy_drift_retrain_required gauge",
+        f"energy_drift_retrain_required {int(metrics['retrain'])}",
+        "# TYPE energy_model_age_days gauge",
+        f"energy_model_age_days {metrics.get('model_age_days') or 0:.3f}",
+    ]
+    if metrics.get("rolling_mae") is not None:
+        lines += ["# TYPE energy_prediction_rolling_mae gauge", f"energy_prediction_rolling_mae {metrics['rolling_mae']:.4f}",
+                  "# TYPE energy_prediction_mae_ratio gauge", f"energy_prediction_mae_ratio {metrics['mae_ratio'] or 0:.4f}"]
+    lines += ["# TYPE energy_feature_mean_shift gauge"]
+    lines += [f'energy_feature_mean_shift{{feature="{name}"}} {stats["mean_shift"]:.4f}' for name, stats in metrics["features"].items()]
+    lines += ["# TYPE energy_feature_psi gauge"]
+    lines += [f'energy_feature_psi{{feature="{name}"}} {stats["psi"]:.4f}' for name, stats in metrics["features"].items()]
+    return "\n".join(lines) + "\n"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Monitorización de deriva de variables y error del modelo.")
+    parser.add_argument("command", choices=["check"])
+    args = parser.parse_args()
+
+    metrics = check_drift()
+    print(json.dumps(metrics, indent=2, default=str))
+    if metrics["retrain"]:
+        log_message(f"⚠️ Reentrenamiento necesario: {', '.join(metrics['reasons'])}")
+        sys.exit(EXIT_RETRAIN)
+    log_message("✅ Sin deriva significativa, no es necesario reentrenar.")
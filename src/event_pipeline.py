@@ -0,0 +1,223 @@
+import os
+import sys
+import time
+import logging
+import subprocess
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from pymongo import MongoClient, ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure, PyMongoError
+
+# Cargar configuración desde .env
+load_dotenv()
+
+# Configuración de MongoDB
+MONGO_URI = os.getenv("MONGO_URI")
+MONGO_DB = os.getenv("MONGO_DB")
+MONGO_COLLECTION = os.getenv("MONGO_COLLECTION")
+MONGO_COLLECTION_METEO = os.getenv("MONGO_COLLECTION_METEO")
+MONGO_COLLECTION_PIPELINE_STATE = os.getenv("MONGO_COLLECTION_PIPELINE_STATE", "pipeline_state")
+
+# Configuración del modo por eventos
+EVENT_DEBOUNCE_SECONDS = int(os.getenv("EVENT_DEBOUNCE_SECONDS", 30))  # Silencio necesario antes de procesar una ráfaga
+EVENT_MAX_DELAY_SECONDS = int(os.getenv("EVENT_MAX_DELAY_SECONDS", 300))  # Espera máxima aunque sigan llegando inserciones
+EVENT_POLL_SECONDS = int(os.getenv("EVENT_POLL_SECONDS", 15))  # Intervalo del modo polling (sin replica set)
+RETRAIN_MIN_NEW_ROWS = int(os.getenv("RETRAIN_MIN_NEW_ROWS", 24))  # Precios nuevos necesarios para reentrenar
+RETRAIN_MIN_INTERVAL = int(os.getenv("RETRAIN_MIN_INTERVAL", 3600))  # Segundos mínimos entre reentrenamientos
+TRAINING_TRIGGER = os.getenv("TRAINING_TRIGGER", "drift")  # always: reentrenar con cada lote suficiente | drift: solo con deriva
+
+# Configurar logging
+log_file = "logs/event_pipeline.log"
+os.makedirs(os.path.dirname(log_file), exist_ok=True)
+logging.basicConfig(filename=log_file, level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# Conectar a MongoDB
+client = MongoClient(MONGO_URI)
+db = client[MONGO_DB]
+collection_state = db[MONGO_COLLECTION_PIPELINE_STATE]
+
+STATE_ID = "event_pipeline"
+
+
+def log_message(message):
+    """Registrar mensaje en log y consola"""
+    logging.info(message)
+    print(message)
+
+
+class PendingWork:
+    """
+    Acumula las inserciones de una colección hasta que la ráfaga termina.
+
+    Se procesa cuando pasan EVENT_DEBOUNCE_SECONDS sin inserciones nuevas o, como máximo,
+    EVENT_MAX_DELAY_SECONDS después de la primera, de modo que una carga de miles de documentos
+    dispara un único paso posterior.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.min_ts = None
+        self.max_ts = None
+        self.first_seen = None
+        self.last_seen = None
+
+    def add(self, timestamp):
+        now = time.monotonic()
+        self.count += 1
+        self.first_seen = self.first_seen or now
+        self.last_seen = now
+        if timestamp is not None:
+            self.min_ts = timestamp if self.min_ts is None else min(self.min_ts, timestamp)
+            self.max_ts = timestamp if self.max_ts is None else max(self.max_ts, timestamp)
+
+    def ready(self):
+        if not self.count:
+            return False
+        now = time.monotonic()
+        return now - self.last_seen >= EVENT_DEBOUNCE_SECONDS or now - self.first_seen >= EVENT_MAX_DELAY_SECONDS
+
+
+def load_state():
+    return collection_state.find_one({"_id": STATE_ID}) or {}
+
+
+def save_state(**fields):
+    collection_state.update_one({"_id": STATE_ID}, {"$set": fields}, upsert=True)
+
+
+def watch_change_stream(resume_token):
+    """
+    Generador de (colección, documento insertado) a partir de un change stream.
+
+    Cuando no hay eventos devuelve (None, checkpoint) con el resume token que cubre todo lo entregado hasta ahora;
+    quien consume decide cuándo guardarlo (solo cuando esos eventos ya se han procesado).
+    """
+    pipeline = [{"$match": {"operationType": "insert", "ns.coll": {"$in": [MONGO_COLLECTION, MONGO_COLLECTION_METEO]}}}]
+    with db.watch(pipeline, resume_after=resume_token, max_await_time_ms=1000) as stream:
+        log_message("👂 Escuchando change streams de MongoDB...")
+        while stream.alive:
+            change = stream.try_next()
+            if change is None:
+                yield None, {"resume_token": stream.resume_token}
+                continue
+            yield change["ns"]["coll"], change["fullDocument"]
+
+
+def watch_polling(watermarks):
+    """
+    Alternativa sin replica set: consulta periódicamente los documentos con _id posterior a la marca de agua.
+
+    Las marcas de agua se guardan en pipeline_state como checkpoint, así que las inserciones hechas con el
+    pipeline parado se cuentan al arrancar. Sin marcas guardadas (primer arranque) se empieza desde el último _id.
+    """
+    log_message(f"🔁 Change streams no disponibles, usando polling cada {EVENT_POLL_SECONDS}s.")
+    watermarks = dict(watermarks or {})
+    for name in [MONGO_COLLECTION, MONGO_COLLECTION_METEO]:
+        if name not in watermarks:
+            last = db[name].find_one({}, {"_id": 1}, sort=[("_id", DESCENDING)])
+            watermarks[name] = last["_id"] if last else None
+
+    while True:
+        for name, watermark in watermarks.items():
+            query = {"_id": {"$gt": watermark}} if watermark is not None else {}
+            for doc in db[name].find(query, {"_id": 1, "timestamp": 1}).sort("_id", ASCENDING):
+                watermarks[name] = doc["_id"]
+                yield name, doc
+        yield None, {"poll_watermarks": dict(watermarks)}
+        time.sleep(EVENT_POLL_SECONDS)
+
+
+def watch_inserts():
+    """Usa change streams si MongoDB es un replica set y polling en caso contrario."""
+    state = load_state()
+    resume_token = state.get("resume_token")
+    try:
+        yield from watch_change_stream(resume_token)
+        return
+    except OperationFailure as e:
+        log_message(f"⚠️ No se pudo abrir el change stream: {e}")
+
+    if resume_token is not None:
+        # El token puede haber caducado (oplog rotado): reintentar desde ahora
+        save_state(resume_token=None)
+        try:
+            yield from watch_change_stream(None)
+            return
+        except OperationFailure as e:
+            log_message(f"⚠️ No se pudo abrir el change stream sin resume token: {e}")
+
+    yield from watch_polling(state.get("poll_watermarks"))
+
+
+def run_training():
+    """Reentrena el modelo en un subproceso, igual que la tarea programada."""
+    log_message("📊 Reentrenando el modelo por llegada de datos nuevos...")
+    subprocess.run([sys.executable, "src/train_model_batch.py"], check=True)
+
+
+def run_event_pipeline():
+    """Bucle principal: inserciones → rescoring del horizonte y reentrenamiento cuando hay suficientes datos."""
+    from forecast_scoring import score_range
+    from drift_monitor import check_drift
+
+    weather = PendingWork()
+    prices = PendingWork()
+    state = load_state()
+    new_rows = state.get("new_price_rows", 0)
+    last_training = state.get("last_training")
+    saved_checkpoint = None  # Última posición guardada en pipeline_state
+
+    for name, event in watch_inserts():
+        if name is not None:
+            (prices if name == MONGO_COLLECTION else weather).add(event.get("timestamp"))
+            continue
+
+        try:
+            # Si una ráfaga está lista se procesan las dos: así, tras procesar, no queda nada pendiente
+            # y el checkpoint puede avanzar al menos cada EVENT_MAX_DELAY_SECONDS
+            if weather.ready() or prices.ready():
+                if weather.min_ts is not None:
+                    scored = score_range(weather.min_ts, weather.max_ts + timedelta(hours=1))
+                    log_message(f"🔮 {weather.count} registros meteorológicos nuevos → {scored} predicciones actualizadas.")
+                weather.reset()
+
+                if prices.count:
+                    new_rows += prices.count
+                    log_message(f"💶 {prices.count} precios nuevos ({new_rows}/{RETRAIN_MIN_NEW_ROWS} para reentrenar).")
+                prices.reset()
+
+            # Guardar la posición solo cuando todo lo recibido hasta ella está procesado; si no, un reinicio
+            # durante el debounce perdería las inserciones acumuladas en memoria. El contador se guarda en
+            # la misma escritura para no contar dos veces los precios al reanudar.
+            if not weather.count and not prices.count and event != saved_checkpoint:
+                save_state(new_price_rows=new_rows, **event)
+                saved_checkpoint = event
+
+            since_training = (datetime.utcnow() - last_training).total_seconds() if last_training else None
+            if new_rows >= RETRAIN_MIN_NEW_ROWS and (since_training is None or since_training >= RETRAIN_MIN_INTERVAL):
+                if TRAINING_TRIGGER == "drift":
+                    drift = check_drift()
+                    if not drift["retrain"]:
+                        log_message(f"⏭️ {new_rows} precios nuevos sin deriva ni degradación del error, no se reentrena.")
+                        new_rows = 0
+                        save_state(new_price_rows=new_rows)
+                        continue
+                    log_message(f"⚠️ Deriva detectada: {', '.join(drift['reasons'])}")
+                # Registrar el intento antes de entrenar para que un fallo respete también el intervalo mínimo
+                last_training = datetime.utcnow()
+                save_state(last_training=last_training)
+                run_training()
+                new_rows = 0
+                save_state(new_price_rows=new_rows)
+                # Con un modelo nuevo, reescribir las predicciones de los últimos días
+                score_range(last_training - timedelta(days=2), last_training + timedelta(days=1))
+        except (PyMongoError, subprocess.CalledProcessError, FileNotFoundError) as e:
+            log_message(f"❌ Error procesando eventos: {e}")
+
+
+if __name__ == "__main__":
+    log_message("🎯 Iniciando pipeline por eventos...")
+    run_event_pipeline()
@@ -0,0 +1,84 @@
+import os
+import argparse
+from datetime import datetime, timedelta
+import numpy as np
+from dotenv import load_dotenv
+from pymongo import MongoClient, ASCENDING, UpdateOne
+from model_registry import load_latest_or_legacy, latest_version, feature_origin, days_since_start
+
+# Cargar configuración desde .env
+load_dotenv()
+
+# Configuración de MongoDB
+MONGO_URI = os.getenv("MONGO_URI")
+MONGO_DB = os.getenv("MONGO_DB")
+MONGO_COLLECTION_METEO = os.getenv("MONGO_COLLECTION_METEO")
+MONGO_COLLECTION_PREDICTIONS = os.getenv("MONGO_COLLECTION_PREDICTIONS", "price_predictions")
+METEO_HISTORICAL_START_DATE = os.getenv("METEO_HISTORICAL_START_DATE", "2015-01-01")
+BIDDING_ZONE = os.getenv("BIDDING_ZONE", "DE-LU")
+
+# Variables meteorológicas en el orden usado por el modelo (si los metadatos no lo indican)
+WEATHER_FEATURES = ["temperature", "humidity", "precipitation", "rain", "snowfall", "surface_pressure",
+                    "cloud_cover", "wind_speed_10m", "wind_speed_100m", "wind_direction_10m", "wind_direction_100m"]
+
+# Conectar a MongoDB
+client = MongoClient(MONGO_URI)
+db = client[MONGO_DB]
+collection_meteo = db[MONGO_COLLECTION_METEO]
+collection_predictions = db[MONGO_COLLECTION_PREDICTIONS]
+
+_model = None
+
+
+def get_model():
+    """Devuelve el modelo publicado, recargándolo si el registro apunta a una versión nueva."""
+    global _model
+    if _model is None or _model[2]["version"] != (latest_version() or "legacy"):
+        _model = load_latest_or_legacy()
+    return _model
+
+
+def score_range(start, end):
+    """
+    Predice el precio de cada registro meteorológico en [start, end) y guarda las predicciones.
+
+    Las predicciones se guardan por (bidding_zone, timestamp) junto a la versión del modelo, de modo que
+    una nueva versión reescribe las anteriores.
+    """
+    model, scaler, metadata = get_model()
+    features = metadata.get("features", WEATHER_FEATURES + ["days_since_start"])
+    weather_features = [name for name in features if name != "days_since_start"]
+
+    docs = list(collection_meteo.find({"timestamp": {"$gte": start, "$lt": end}},
+                                      {"_id": 0, "timestamp": 1, **{name: 1 for name in weather_features}}))
+    docs = [doc for doc in docs if all(doc.get(name) is not None for name in weather_features)]
+    if not docs:
+        return 0
+
+    # days_since_start se mide desde el mismo origen que usó el entrenamiento del modelo
+    origin = feature_origin(metadata, METEO_HISTORICAL_START_DATE)
+    columns = {name: np.array([doc[name] for doc in docs], dtype=np.float64) for name in weather_features}
+    columns["days_since_start"] = days_since_start([doc["timestamp"] for doc in docs], origin)
+    X = np.column_stack([columns[name] for name in features])
+
+    predictions = model.predict(scaler.transform(X))
+
+    scored_at = datetime.utcnow()
+    collection_predictions.create_index([("bidding_zone", ASCENDING), ("timestamp", ASCENDING)], unique=True)
+    collection_predictions.bulk_write([
+        UpdateOne({"bidding_zone": BIDDING_ZONE, "timestamp": doc["timestamp"]},
+                  {"$set": {"predicted_price": float(price), "model_version": metadata["version"], "scored_at": scored_at}},
+                  upsert=True)
+        for doc, price in zip(docs, predictions)
+    ], ordered=False)
+    return len(docs)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Predice y guarda el precio para los registros meteorológicos recientes.")
+    parser.add_argument("--days", type=int, default=7, help="Días hacia atrás a puntuar")
+    args = parser.parse_args()
+
+    end = datetime.utcnow() + timedelta(days=1)
+    count = score_range(end - timedelta(days=args.days + 1), end)
+    print(f"✅ {count} predicciones guardadas en {MONGO_COLLECTION_PREDICTIONS}.")
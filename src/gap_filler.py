@@ -0,0 +1,267 @@
+import os
+import math
+import heapq
+import logging
+import argparse
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from pymongo import MongoClient, ASCENDING
+from ingestion_pipeline import run_pipeline, Throttle
+from data_validation import settled_quarantine_query
+
+# Cargar configuración desde .env
+load_dotenv()
+
+# Configuración de MongoDB
+MONGO_URI = os.getenv("MONGO_URI")
+MONGO_DB = os.getenv("MONGO_DB")
+MONGO_COLLECTION = os.getenv("MONGO_COLLECTION")
+MONGO_COLLECTION_METEO = os.getenv("MONGO_COLLECTION_METEO")
+MONGO_COLLECTION_QUARANTINE = os.getenv("MONGO_COLLECTION_QUARANTINE", "quarantine")
+BIDDING_ZONE = os.getenv("BIDDING_ZONE", "DE-LU")
+
+# Inicio esperado de cada serie y límites de las APIs
+HISTORICAL_START_DATE = os.getenv("HISTORICAL_START_DATE", "2016-01-01")
+METEO_HISTORICAL_START_DATE = os.getenv("METEO_HISTORICAL_START_DATE", HISTORICAL_START_DATE)
+DAYS_PER_REQUEST = int(os.getenv("DAYS_PER_REQUEST", 7))  # Máximo de días por petición a energy-charts
+METEO_DAYS_PER_REQUEST = int(os.getenv("METEO_DAYS_PER_REQUEST", 30))  # Máximo de días por petición a Open-Meteo
+SLEEP_TIME = int(os.getenv("SLEEP_TIME", 5))  # Espera entre requests a energy-charts (en segundos)
+METEO_SLEEP_TIME = int(os.getenv("METEO_SLEEP_TIME", 10))  # Espera entre requests a Open-Meteo (en segundos)
+
+# Resolución esperada de cada serie. Un hueco es cualquier salto mayor que la resolución, así que debe ser
+# la cadencia real de la serie: con 60 minutos en una serie cuartohoraria no se detecta un cuarto de hora suelto.
+ENERGY_RESOLUTION_MINUTES = int(os.getenv("ENERGY_RESOLUTION_MINUTES", 60))  # Resolución antes del primer cambio
+# Cambios de resolución "instante UTC=minutos" separados por comas. El mercado diario europeo pasó a periodos
+# de 15 minutos con la entrega del 1 de octubre de 2025 (medianoche de Europe/Berlin = 22:00 UTC del día anterior)
+ENERGY_RESOLUTION_CHANGES = os.getenv("ENERGY_RESOLUTION_CHANGES", "2025-09-30T22:00=15")
+METEO_RESOLUTION_MINUTES = int(os.getenv("METEO_RESOLUTION_MINUTES", 60))
+
+# Limitar el escaneo tras cada extracción a los últimos N días; `--full` (o 0) revisa desde la fecha histórica de inicio
+GAP_LOOKBACK_DAYS = int(os.getenv("GAP_LOOKBACK_DAYS", 45))
+
+# Configurar logging
+log_file = "logs/gap_filler.log"
+os.makedirs(os.path.dirname(log_file), exist_ok=True)
+logging.basicConfig(filename=log_file, level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# Conectar a MongoDB
+client = MongoClient(MONGO_URI)
+db = client[MONGO_DB]
+
+
+def log_message(message):
+    """Registrar mensaje en log y consola"""
+    logging.info(message)
+    print(message)
+
+
+def parse_resolutions(base_minutes, changes=""):
+    """
+    Convierte la resolución base y los cambios "2025-09-30T22:00=15,..." en una lista ordenada de
+    (desde, resolución), donde el primer tramo empieza en None (sin límite inferior).
+    """
+    resolutions = [(None, timedelta(minutes=base_minutes))]
+    for change in filter(None, (item.strip() for item in changes.split(","))):
+        since, minutes = change.split("=")
+        resolutions.append((datetime.fromisoformat(since), timedelta(minutes=int(minutes))))
+    return [resolutions[0]] + sorted(resolutions[1:])
+
+
+def resolution_periods(resolutions, start, end):
+    """Divide [start, end) en tramos (inicio, fin, resolución) según los cambios de resolución."""
+    periods = []
+    for i, (since, resolution) in enumerate(resolutions):
+        until = resolutions[i + 1][0] if i + 1 < len(resolutions) else end
+        period_start, period_end = max(start, since or start), min(end, until)
+        if period_start < period_end:
+            periods.append((period_start, period_end, resolution))
+    return periods
+
+
+def _slots_between(previous, current, resolution):
+    """Número de slots que faltan estrictamente entre dos instantes."""
+    return math.ceil((current - previous) / resolution) - 1
+
+
+def find_gaps(timestamps, resolution, start, end):
+    """
+    Recorre una secuencia ordenada de timestamps en una sola pasada y devuelve los huecos.
+
+    Cada hueco es una tupla (primer_slot_faltante, ultimo_slot_faltante, n_slots).
+    `start` es el primer slot esperado y `end` el límite superior (exclusivo).
+    """
+    gaps = []
+    previous = start - resolution
+
+    for ts in timestamps:
+        if ts < start:
+            continue
+        if ts >= end:
+            break
+        missing = _slots_between(previous, ts, resolution)
+        if missing > 0:
+            gaps.append((previous + resolution, previous + missing * resolution, missing))
+        if ts > previous:
+            previous = ts
+
+    missing = _slots_between(previous, end, resolution)
+    if missing > 0:
+        gaps.append((previous + resolution, previous + missing * resolution, missing))
+
+    return gaps
+
+
+def merge_gaps_into_windows(gaps, max_days, pad_days=0):
+    """
+    Agrupa los huecos en el mínimo número de ventanas de petición de `max_days` días como máximo.
+
+    Se abre una ventana en el primer día sin cubrir y se extiende tanto como permita el límite de la
+    API; huecos cercanos comparten petición y huecos largos se trocean. Las fechas son inclusivas.
+
+    Con `pad_days` cada ventana se amplía ese número de días por cada lado (sin pasar de `max_days`),
+    para APIs que interpretan las fechas en hora local y no en UTC.
+    """
+    max_days = max(1, max_days - 2 * pad_days)
+    windows = []
+    for first, last, missing in gaps:
+        day, last_day = first.date(), last.date()
+        while day <= last_day:
+            if windows and day <= windows[-1]["start"] + timedelta(days=max_days - 1):
+                window = windows[-1]
+            else:
+                window = {"start": day, "end": day, "gaps": 0, "missing": 0}
+                windows.append(window)
+
+            window["end"] = min(last_day, window["start"] + timedelta(days=max_days - 1))
+            day = window["end"] + timedelta(days=1)
+
+        # Contabilizar el hueco en la ventana donde empieza (informativo para el reporte)
+        for window in reversed(windows):
+            if window["start"] <= first.date() <= window["end"]:
+                window["gaps"] += 1
+                window["missing"] += missing
+                break
+
+    for window in windows:
+        window["start"] -= timedelta(days=pad_days)
+        window["end"] += timedelta(days=pad_days)
+    return windows
+
+
+def _energy_stages():
+    from historical_data_ingestion import fetch_prices
+    from price_ingestion import transform_prices, write_prices
+    return fetch_prices, transform_prices, write_prices
+
+
+def _meteo_stages():
+    from historical_data_ingestion_meteo import fetch_weather_window, transform_weather_data
+    from data_ingestion_meteo import load_weather_data_filtered
+    return fetch_weather_window, transform_weather_data, load_weather_data_filtered
+
+
+# Series vigiladas: colección, filtro del índice (zona, timestamp), resolución y límites de la API
+SOURCES = {
+    "energy": {
+        "collection": MONGO_COLLECTION,
+        "filter": {"bidding_zone": BIDDING_ZONE},
+        "index": [("bidding_zone", ASCENDING), ("timestamp", ASCENDING)],
+        "start_date": HISTORICAL_START_DATE,
+        "resolutions": parse_resolutions(ENERGY_RESOLUTION_MINUTES, ENERGY_RESOLUTION_CHANGES),
+        "max_days": DAYS_PER_REQUEST,
+        "sleep_time": SLEEP_TIME,
+        # energy-charts interpreta las fechas sin hora como días de Europe/Berlin: un slot de las 22:00 o 23:00 UTC
+        # del día D cae en el día D+1 local, así que se pide un día más por cada lado (el write descarta duplicados)
+        "pad_days": 1,
+        "stages": _energy_stages,
+    },
+    "meteo": {
+        "collection": MONGO_COLLECTION_METEO,
+        "filter": {},
+        "index": [("timestamp", ASCENDING)],
+        "start_date": METEO_HISTORICAL_START_DATE,
+        "resolutions": parse_resolutions(METEO_RESOLUTION_MINUTES),
+        "max_days": METEO_DAYS_PER_REQUEST,
+        "sleep_time": METEO_SLEEP_TIME,
+        "pad_days": 0,  # Open-Meteo devuelve las fechas en GMT por defecto
+        "stages": _meteo_stages,
+    },
+}
+
+
+def scan_source(name, end=None, lookback_days=GAP_LOOKBACK_DAYS):
+    """
+    Escanea el índice (zona, timestamp) de una serie y devuelve sus huecos y ventanas de petición.
+
+    Cada tramo de resolución se escanea por separado con su cadencia. Los slots en cuarentena por motivos
+    deterministas cuentan como conocidos, no como huecos. `lookback_days=0` revisa todo el histórico.
+    """
+    source = SOURCES[name]
+    collection = db[source["collection"]]
+    collection.create_index(source["index"])
+
+    start = datetime.strptime(source["start_date"], "%Y-%m-%d")
+    if lookback_days > 0:
+        start = max(start, datetime.combine(datetime.utcnow().date(), datetime.min.time()) - timedelta(days=lookback_days))
+
+    if end is None:
+        # Open-Meteo (archivo) publica días completos; energy-charts llega hasta la hora actual
+        end = datetime.utcnow() if name == "energy" else datetime.combine(datetime.utcnow().date(), datetime.min.time())
+
+    gaps = []
+    for period_start, period_end, resolution in resolution_periods(source["resolutions"], start, end):
+        query = dict(source["filter"], timestamp={"$gte": period_start, "$lt": period_end})
+        cursor = collection.find(query, {"_id": 0, "timestamp": 1}).sort("timestamp", ASCENDING)
+
+        # Los slots rechazados por un motivo determinista darían el mismo dato al volver a pedirlos;
+        # los nulos se reintentan hasta QUARANTINE_MAX_ATTEMPTS descargas
+        quarantine_query = settled_quarantine_query(name, period_start, period_end)
+        quarantined = db[MONGO_COLLECTION_QUARANTINE].find(quarantine_query, {"_id": 0, "timestamp": 1}).sort("timestamp", ASCENDING)
+
+        timestamps = heapq.merge((doc["timestamp"] for doc in cursor), (doc["timestamp"] for doc in quarantined))
+        gaps += find_gaps(timestamps, resolution, period_start, period_end)
+
+    windows = merge_gaps_into_windows(gaps, source["max_days"], source["pad_days"])
+    return gaps, windows
+
+
+def report(name, gaps, windows):
+    """Muestra los huecos detectados y las ventanas que se descargarían."""
+    total_missing = sum(missing for _, _, missing in gaps)
+    log_message(f"🔎 [{name}] {len(gaps)} huecos, {total_missing} slots faltantes, {len(windows)} peticiones necesarias.")
+    for window in windows:
+        log_message(f"   - {window['start']} → {window['end']}: {window['gaps']} huecos, {window['missing']} slots")
+
+
+def fill_gaps(name, windows):
+    """Descarga y almacena únicamente las ventanas con huecos, con descarga y escritura solapadas."""
+    fetch, transform, write = SOURCES[name]["stages"]()
+
+    def requests():
+        for window in windows:
+            start_str, end_str = window["start"].strftime("%Y-%m-%d"), window["end"].strftime("%Y-%m-%d")
+            log_message(f"📥 [{name}] Rellenando hueco {start_str} - {end_str}...")
+            yield start_str, end_str
+
+    run_pipeline(f"gaps-{name}", requests(), [
+        ("fetch", Throttle(fetch, SOURCES[name]["sleep_time"])),
+        ("transform", transform),
+        ("write", write),
+    ])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Detecta y rellena huecos en las series de energía y clima.")
+    parser.add_argument("--source", choices=["energy", "meteo", "all"], default="all", help="Serie a revisar")
+    parser.add_argument("--dry-run", action="store_true", help="Solo mostrar lo que se descargaría")
+    parser.add_argument("--full", action="store_true", help="Revisar todo el histórico en vez de los últimos GAP_LOOKBACK_DAYS días")
+    args = parser.parse_args()
+
+    names = list(SOURCES) if args.source == "all" else [args.source]
+    for name in names:
+        gaps, windows = scan_source(name, lookback_days=0 if args.full else GAP_LOOKBACK_DAYS)
+        report(name, gaps, windows)
+        if not args.dry_run and windows:
+            fill_gaps(name, windows)
+
+    log_message("🏁 Revisión de huecos completada.")
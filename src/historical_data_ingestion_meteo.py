@@ -1,10 +1,13 @@
 import os
-import time
 import logging
 import requests
 from pymongo import MongoClient
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
+from response_cache import cached_fetch
+from ingestion_pipeline import run_pipeline, Throttle
+from data_validation import validate_weather_payload
+from drift_monitor import update_feature_stats
 
 # Cargar configuración desde .env
 load_dotenv()
@@ -14,6 +17,7 @@ METEO_API_URL = os.getenv("METEO_API_URL")
 LATITUDE = os.getenv("METEO_LATITUDE")
 LONGITUDE = os.getenv("METEO_LONGITUDE")
 HISTORICAL_START_DATE = os.getenv("METEO_HISTORICAL_START_DATE")
+METEO_SLEEP_TIME = int(os.getenv("METEO_SLEEP_TIME", 10))  # Espera entre requests reales a Open-Meteo (en segundos)
 
 # Configuración de MongoDB
 MONGO_URI = os.getenv("MONGO_URI")
@@ -44,16 +48,25 @@ def fetch_historical_weather_data(start_date, end_date):
         "end_date": end_date,
         "hourly": "temperature_2m,relative_humidity_2m,precipitation,rain,snowfall,surface_pressure,cloud_cover,wind_speed_10m,wind_speed_100m,wind_direction_10m,wind_direction_100m",
     }
+    return cached_fetch(METEO_API_URL, params, end_date, lambda: request_weather_data(params))
+
+def request_weather_data(params):
+    """Realiza la petición HTTP a Open-Meteo."""
     try:
         response = requests.get(METEO_API_URL, params=params)
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
-        log_message(f"Error al obtener datos de Open-Meteo ({start_date} - {end_date}): {e}")
+        log_message(f"Error al obtener datos de Open-Meteo ({params['start_date']} - {params['end_date']}): {e}")
         return None
 
 def transform_weather_data(data):
-    """Transforma los datos de Open-Meteo en formato MongoDB."""
+    """Valida y transforma los datos de Open-Meteo en formato MongoDB."""
+    # Las filas inválidas (nulos, fuera de rango, duplicadas, picos) van a cuarentena y no se escriben
+    data = validate_weather_payload(data)
+    if data is None:
+        return []
+
     transformed_data = []
     hourly_data = data.get("hourly", {})
     times = hourly_data.get("time", [])
@@ -79,10 +92,21 @@ def load_weather_data(data):
     """Inserta los datos transformados en MongoDB evitando duplicados."""
     if data:
         collection.insert_many(data)
+        update_feature_stats(data)
         log_message(f"{len(data)} registros meteorológicos insertados en MongoDB.")
-
-def download_historical_meteo_data():
-    """Descarga datos históricos en lotes de 30 días."""
+    return len(data)
+
+def fetch_weather_window(window):
+    """Descarga una ventana (inicio, fin) de Open-Meteo."""
+    start_str, end_str = window
+    log_message(f"Descargando datos meteorológicos desde {start_str} hasta {end_str}...")
+    raw_data = fetch_historical_weather_data(start_str, end_str)
+    if not raw_data:
+        log_message(f"No se obtuvieron datos para {start_str} - {end_str}.")
+    return raw_data or None
+
+def historical_windows():
+    """Ventanas de 30 días desde METEO_HISTORICAL_START_DATE hasta hoy."""
     start_date = datetime.strptime(HISTORICAL_START_DATE, "%Y-%m-%d")
     end_date = datetime.today()
 
@@ -90,21 +114,22 @@ def download_historical_meteo_data():
         next_date = start_date + timedelta(days=30)
         if next_date > end_date:
             next_date = end_date
-
-        log_message(f"Descargando datos meteorológicos desde {start_date.strftime('%Y-%m-%d')} hasta {next_date.strftime('%Y-%m-%d')}...")
-        raw_data = fetch_historical_weather_data(start_date.strftime("%Y-%m-%d"), next_date.strftime("%Y-%m-%d"))
-
-        if raw_data:
-            transformed_data = transform_weather_data(raw_data)
-            load_weather_data(transformed_data)
-        else:
-            log_message(f"No se obtuvieron datos para {start_date.strftime('%Y-%m-%d')} - {next_date.strftime('%Y-%m-%d')}.")
-
-        log_message("Esperando 10 segundos antes de la próxima solicitud...")
-        time.sleep(10)
-
+        yield start_date.strftime("%Y-%m-%d"), next_date.strftime("%Y-%m-%d")
         start_date = next_date + timedelta(days=1)
 
+def download_historical_meteo_data():
+    """
+    Descarga datos históricos en lotes de 30 días.
+
+    Descarga, validación y escritura se solapan en un pipeline por etapas; entre peticiones reales a
+    Open-Meteo se esperan METEO_SLEEP_TIME segundos (las respuestas servidas desde la caché no consumen cuota).
+    """
+    run_pipeline("meteo-historical", historical_windows(), [
+        ("fetch", Throttle(fetch_weather_window, METEO_SLEEP_TIME)),
+        ("transform", transform_weather_data),
+        ("write", load_weather_data),
+    ])
+
 if __name__ == "__main__":
     log_message("Iniciando descarga histórica de datos meteorológicos...")
     download_historical_meteo_data()
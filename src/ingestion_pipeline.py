@@ -0,0 +1,171 @@
+import os
+import time
+import queue
+import logging
+import threading
+from dotenv import load_dotenv
+import response_cache
+
+# Cargar configuración desde .env
+load_dotenv()
+
+INGESTION_QUEUE_SIZE = int(os.getenv("INGESTION_QUEUE_SIZE", 2))  # Elementos máximos entre dos etapas
+INGESTION_PROGRESS_SECONDS = int(os.getenv("INGESTION_PROGRESS_SECONDS", 60))  # Intervalo del log de progreso
+QUEUE_SAMPLE_SECONDS = 0.5  # Intervalo de muestreo de la profundidad de las colas
+
+# Marca de fin de flujo que cada etapa propaga a la siguiente
+_DONE = object()
+
+
+def log_message(message):
+    """Registrar mensaje en log y consola"""
+    logging.info(message)
+    print(message)
+
+
+class Throttle:
+    """
+    Envuelve la función de descarga para respetar un intervalo mínimo entre peticiones reales a la API.
+
+    Las respuestas servidas desde la caché de respuestas no cuentan, así que una re-ingesta cacheada no espera.
+    """
+
+    def __init__(self, fetch, min_interval):
+        self.fetch = fetch
+        self.min_interval = min_interval
+        self.last_request = None
+
+    def __call__(self, *args):
+        if self.last_request is not None:
+            wait = self.last_request + self.min_interval - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+        result = self.fetch(*args)
+        if not response_cache.last_lookup_hit:
+            self.last_request = time.monotonic()
+        return result
+
+
+class Stage:
+    """Una etapa del pipeline: aplica `function` a cada elemento; si devuelve None, el elemento se descarta."""
+
+    def __init__(self, name, function):
+        self.name = name
+        self.function = function
+        self.items_in = 0
+        self.items_out = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+
+    def run(self, inbox, outbox):
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                if outbox is not None:
+                    outbox.put(_DONE)
+                return
+
+            self.items_in += 1
+            start = time.perf_counter()
+            try:
+                result = self.function(item)
+            except Exception as e:
+                self.errors += 1
+                log_message(f"❌ [{self.name}] Error procesando un elemento: {e}")
+                result = None
+            self.busy_seconds += time.perf_counter() - start
+
+            if result is not None:
+                self.items_out += 1
+                if outbox is not None:
+                    # put bloqueante: si la etapa siguiente va más lenta, esta espera (backpressure)
+                    outbox.put(result)
+
+
+class QueueStats:
+    """Profundidad de una cola muestreada periódicamente."""
+
+    def __init__(self, name, q):
+        self.name = name
+        self.queue = q
+        self.samples = 0
+        self.total_depth = 0
+        self.max_depth = 0
+
+    def sample(self):
+        depth = self.queue.qsize()
+        self.samples += 1
+        self.total_depth += depth
+        self.max_depth = max(self.max_depth, depth)
+
+    @property
+    def mean_depth(self):
+        return self.total_depth / self.samples if self.samples else 0.0
+
+
+def run_pipeline(name, source, stages, queue_size=INGESTION_QUEUE_SIZE):
+    """
+    Ejecuta `source` (iterable de elementos de trabajo, p. ej. ventanas de fechas) a través de `stages`,
+    una lista de (nombre, función), con un hilo por etapa y colas acotadas entre ellas.
+
+    Mientras una etapa escribe la ventana N en MongoDB, la anterior ya transforma la N+1 y la primera descarga
+    la N+2. Como las colas tienen tamaño `queue_size`, nunca hay más de unas pocas ventanas en memoria.
+
+    Devuelve las métricas por etapa (elementos, throughput, ocupación) y por cola (profundidad media y máxima).
+    """
+    stages = [Stage(stage_name, function) for stage_name, function in stages]
+    queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+    queue_stats = [QueueStats(f"→ {stage.name}", q) for stage, q in zip(stages, queues)]
+
+    threads = []
+    for i, stage in enumerate(stages):
+        outbox = queues[i + 1] if i + 1 < len(queues) else None
+        thread = threading.Thread(target=stage.run, args=(queues[i], outbox), name=f"{name}-{stage.name}", daemon=True)
+        thread.start()
+        threads.append(thread)
+
+    def feed():
+        try:
+            for item in source:
+                queues[0].put(item)
+        except Exception as e:
+            log_message(f"❌ [{name}] Error generando elementos de trabajo: {e}")
+        finally:
+            queues[0].put(_DONE)
+
+    feeder = threading.Thread(target=feed, name=f"{name}-source", daemon=True)
+    feeder.start()
+
+    start = time.perf_counter()
+    last_progress = start
+    while threads[-1].is_alive():
+        threads[-1].join(QUEUE_SAMPLE_SECONDS)
+        for stats in queue_stats:
+            stats.sample()
+        if time.perf_counter() - last_progress >= INGESTION_PROGRESS_SECONDS:
+            last_progress = time.perf_counter()
+            log_message(f"⏱️ [{name}] " + " | ".join(f"{stage.name}: {stage.items_in}" for stage in stages)
+                        + " | colas: " + ", ".join(str(q.qsize()) for q in queues))
+    elapsed = time.perf_counter() - start
+
+    metrics = {
+        "pipeline": name,
+        "elapsed_seconds": elapsed,
+        "stages": [{"name": stage.name, "items_in": stage.items_in, "items_out": stage.items_out,
+                    "errors": stage.errors, "busy_seconds": stage.busy_seconds,
+                    "throughput": stage.items_in / elapsed if elapsed else 0.0,
+                    "utilization": stage.busy_seconds / elapsed if elapsed else 0.0} for stage in stages],
+        "queues": [{"name": stats.name, "capacity": queue_size, "mean_depth": stats.mean_depth,
+                    "max_depth": stats.max_depth} for stats in queue_stats],
+    }
+    log_metrics(metrics)
+    return metrics
+
+
+def log_metrics(metrics):
+    """Resumen de throughput por etapa y profundidad de las colas."""
+    log_message(f"📊 [{metrics['pipeline']}] Pipeline completado en {metrics['elapsed_seconds']:.1f}s")
+    for stage, stats in zip(metrics["stages"], metrics["queues"]):
+        log_message(f"   - {stage['name']:<10} {stage['items_in']:>5} elementos ({stage['throughput']:.2f}/s), "
+                    f"ocupada {stage['utilization'] * 100:.0f}%, {stage['errors']} errores | "
+                    f"cola de entrada media {stats['mean_depth']:.1f} / máx {stats['max_depth']} de {stats['capacity']}")
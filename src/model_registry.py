@@ -0,0 +1,350 @@
+import os
+import sys
+import json
+import math
+import time
+import shutil
+import argparse
+import tempfile
+from datetime import datetime
+import numpy as np
+from dotenv import load_dotenv
+
+# Cargar configuración desde .env
+load_dotenv()
+
+# Configuración del registro de modelos
+MODEL_REGISTRY_DIR = os.getenv("MODEL_REGISTRY_DIR", "models/registry")
+MODEL_REGISTRY_KEEP = int(os.getenv("MODEL_REGISTRY_KEEP", 5))  # Versiones que se conservan en disco
+MODEL_THRESHOLD_DTYPE = os.getenv("MODEL_THRESHOLD_DTYPE", "float32")  # float64, float32 o float16
+MODEL_COMPRESS = os.getenv("MODEL_COMPRESS", "true").lower() == "true"
+LEGACY_MODEL_PATH = os.getenv("MODEL_PATH", "models/energy_price_model.pkl")
+
+LATEST_FILE = "LATEST"
+ARRAYS_FILE = "forest.npz"
+METADATA_FILE = "metadata.json"
+
+# Número máximo de pares (muestra, árbol) que se recorren a la vez al predecir
+PREDICT_CHUNK_PAIRS = 2_000_000
+
+
+class CompactForest:
+    """
+    Bosque de árboles de regresión almacenado como arrays planos de nodos.
+
+    Todos los árboles comparten los mismos arrays; `roots` indica el nodo raíz de cada uno y los hijos
+    usan índices globales (-1 en las hojas). La predicción recorre todos los árboles a la vez con numpy.
+
+    En un bosque aleatorio la predicción es la media de los árboles; en gradient boosting (`learning_rate`
+    e `init` definidos) es `init + learning_rate * suma de los árboles`.
+    """
+
+    def __init__(self, left, right, feature, threshold, value, roots, learning_rate=None, init=None):
+        self.left = left
+        self.right = right
+        self.feature = feature
+        self.threshold = threshold
+        self.value = value
+        self.roots = roots
+        self.learning_rate = None if learning_rate is None else float(learning_rate)
+        self.init = None if init is None else float(init)
+
+    @property
+    def n_estimators(self):
+        return len(self.roots)
+
+    @property
+    def n_nodes(self):
+        return len(self.left)
+
+    @property
+    def is_boosting(self):
+        return self.learning_rate is not None
+
+    @property
+    def supports_intervals(self):
+        """Los árboles de boosting no son muestras independientes: su dispersión no es un intervalo."""
+        return not self.is_boosting
+
+    @classmethod
+    def from_sklearn(cls, model, threshold_dtype="float32"):
+        """Convierte un RandomForestRegressor/ExtraTreesRegressor/GradientBoostingRegressor entrenado al formato compacto."""
+        lefts, rights, features, thresholds, values, roots = [], [], [], [], [], []
+        offset = 0
+        boosting = hasattr(model, "learning_rate")
+        estimators = model.estimators_[:, 0] if boosting else model.estimators_
+        for estimator in estimators:
+            tree = estimator.tree_
+            is_leaf = tree.children_left == -1
+            lefts.append(np.where(is_leaf, -1, tree.children_left + offset).astype(np.int32))
+            rights.append(np.where(is_leaf, -1, tree.children_right + offset).astype(np.int32))
+            features.append(np.where(is_leaf, 0, tree.feature).astype(np.int16))
+            thresholds.append(tree.threshold.astype(threshold_dtype))
+            values.append(tree.value[:, 0, 0].astype(np.float32))
+            roots.append(offset)
+            offset += tree.node_count
+
+        boosting_params = {}
+        if boosting:
+            boosting_params = {"learning_rate": model.learning_rate, "init": model.init_.constant_.ravel()[0]}
+        return cls(np.concatenate(lefts), np.concatenate(rights), np.concatenate(features),
+                   np.concatenate(thresholds), np.concatenate(values), np.array(roots, dtype=np.int32),
+                   **boosting_params)
+
+    def to_arrays(self):
+        arrays = {"left": self.left, "right": self.right, "feature": self.feature,
+                  "threshold": self.threshold, "value": self.value, "roots": self.roots}
+        if self.is_boosting:
+            arrays.update(learning_rate=np.float64(self.learning_rate), init=np.float64(self.init))
+        return arrays
+
+    def apply(self, X):
+        """Devuelve el índice de la hoja alcanzada por cada muestra en cada árbol, shape (n_muestras, n_árboles)."""
+        X = np.asarray(X, dtype=np.float32)
+        n_samples, n_trees = X.shape[0], self.n_estimators
+
+        nodes = np.tile(self.roots, n_samples)
+        samples = np.repeat(np.arange(n_samples), n_trees)
+        active = np.flatnonzero(self.left[nodes] != -1)
+
+        while active.size:
+            node = nodes[active]
+            go_left = X[samples[active], self.feature[node]] <= self.threshold[node]
+            node = np.where(go_left, self.left[node], self.right[node])
+            nodes[active] = node
+            active = active[self.left[node] != -1]
+
+        return nodes.reshape(n_samples, n_trees)
+
+    def predict_per_tree(self, X):
+        """Predicción de cada árbol para cada muestra, shape (n_muestras, n_árboles)."""
+        X = np.asarray(X, dtype=np.float32)
+        chunk = max(1, PREDICT_CHUNK_PAIRS // self.n_estimators)
+        return np.vstack([self.value[self.apply(X[i:i + chunk])] for i in range(0, max(len(X), 1), chunk)])
+
+    def predict(self, X):
+        per_tree = self.predict_per_tree(X)
+        if self.is_boosting:
+            return self.init + self.learning_rate * per_tree.sum(axis=1, dtype=np.float64)
+        return per_tree.mean(axis=1)
+
+    def predict_distribution(self, X, quantiles=(), with_std=False):
+        """
+        Predicción media más cuantiles y/o desviación típica de las predicciones de los árboles.
+
+        Todo sale de una única pasada vectorizada sobre el bosque, así que el coste extra respecto a
+        `predict` se limita a ordenar n_árboles valores por muestra.
+        """
+        if self.is_boosting:
+            if len(quantiles) or with_std:
+                raise ValueError("El modelo publicado es gradient boosting y no ofrece intervalos de predicción.")
+            return {"mean": self.predict(X)}
+        per_tree = self.predict_per_tree(X)
+        result = {"mean": per_tree.mean(axis=1)}
+        if len(quantiles):
+            result["quantiles"] = dict(zip(quantiles, np.quantile(per_tree, quantiles, axis=1)))
+        if with_std:
+            result["std"] = per_tree.std(axis=1)
+        return result
+
+
+class CompactScaler:
+    """Equivalente a StandardScaler.transform a partir de los parámetros guardados en los metadatos."""
+
+    def __init__(self, mean, scale):
+        self.mean_ = np.asarray(mean, dtype=np.float64)
+        self.scale_ = np.asarray(scale, dtype=np.float64)
+
+    @property
+    def n_features_in_(self):
+        return len(self.mean_)
+
+    def transform(self, X):
+        return (np.asarray(X, dtype=np.float64) - self.mean_) / self.scale_
+
+
+def parse_quantiles(value):
+    """Convierte "0.1,0.9" en (0.1, 0.9), validando que todos sean finitos y estén en [0, 1]."""
+    if not value:
+        return ()
+    quantiles = tuple(float(q) for q in value.split(","))
+    # NaN no cumple ninguna comparación, así que se comprueba el rango en positivo
+    if not all(math.isfinite(q) and 0 <= q <= 1 for q in quantiles):
+        raise ValueError(f"Los cuantiles deben estar entre 0 y 1: {value}")
+    return quantiles
+
+
+def feature_origin(metadata, default):
+    """
+    Origen de days_since_start de un modelo: el guardado al entrenar o, en modelos anteriores,
+    el inicio de su ventana de entrenamiento (o `default` si tampoco existe).
+    """
+    origin = metadata.get("days_since_start_origin") or metadata.get("training_window", {}).get("start") or default
+    return datetime.fromisoformat(origin) if isinstance(origin, str) else origin
+
+
+def days_since_start(timestamps, origin):
+    """Días completos entre cada timestamp y `origin`: el mismo cálculo al entrenar y al predecir."""
+    timestamps = np.asarray(timestamps, dtype="datetime64[s]")
+    return ((timestamps - np.datetime64(origin, "s")) // np.timedelta64(1, "D")).astype(np.float64)
+
+
+def _version_dir(version):
+    return os.path.join(MODEL_REGISTRY_DIR, version)
+
+
+def _write_atomic(path, content):
+    """Escribe un fichero de texto mediante fichero temporal + rename."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def list_versions():
+    """Versiones publicadas en el registro, de la más antigua a la más reciente."""
+    if not os.path.isdir(MODEL_REGISTRY_DIR):
+        return []
+    return sorted(name for name in os.listdir(MODEL_REGISTRY_DIR)
+                  if not name.startswith(".") and os.path.isfile(os.path.join(_version_dir(name), METADATA_FILE)))
+
+
+def latest_version():
+    """Versión apuntada por LATEST (o None si el registro está vacío)."""
+    try:
+        with open(os.path.join(MODEL_REGISTRY_DIR, LATEST_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def save_model(model, scaler, metadata, threshold_dtype=MODEL_THRESHOLD_DTYPE, compress=MODEL_COMPRESS):
+    """
+    Publica una nueva versión del modelo en el registro.
+
+    La versión se escribe en un directorio temporal que se renombra de forma atómica y solo después se
+    actualiza LATEST, de modo que un lector concurrente nunca ve un artefacto a medio escribir.
+    """
+    forest = model if isinstance(model, CompactForest) else CompactForest.from_sklearn(model, threshold_dtype)
+    version = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+    os.makedirs(MODEL_REGISTRY_DIR, exist_ok=True)
+
+    metadata = dict(metadata, version=version, created_at=datetime.utcnow().isoformat(),
+                    scaler={"mean": scaler.mean_.tolist(), "scale": scaler.scale_.tolist()},
+                    artifact={"format": "compact-boosting" if forest.is_boosting else "compact-forest", "n_estimators": forest.n_estimators,
+                              "n_nodes": forest.n_nodes, "threshold_dtype": str(forest.threshold.dtype),
+                              "compressed": compress})
+
+    tmp_dir = tempfile.mkdtemp(prefix=f".{version}.", dir=MODEL_REGISTRY_DIR)
+    save = np.savez_compressed if compress else np.savez
+    save(os.path.join(tmp_dir, ARRAYS_FILE), **forest.to_arrays())
+    with open(os.path.join(tmp_dir, METADATA_FILE), "w") as f:
+        json.dump(metadata, f, indent=2, default=str)
+    os.replace(tmp_dir, _version_dir(version))
+
+    _write_atomic(os.path.join(MODEL_REGISTRY_DIR, LATEST_FILE), version)
+    prune()
+    return version
+
+
+def load_metadata(version=None):
+    """Lee solo los metadatos de una versión (por defecto, la última), sin cargar los árboles."""
+    version = version or latest_version()
+    if version is None:
+        return None
+    with open(os.path.join(_version_dir(version), METADATA_FILE)) as f:
+        return json.load(f)
+
+
+def load_model(version=None):
+    """Carga (modelo, scaler, metadatos) de una versión del registro (por defecto, la última)."""
+    version = version or latest_version()
+    if version is None:
+        raise FileNotFoundError(f"No hay modelos publicados en {MODEL_REGISTRY_DIR}.")
+
+    metadata = load_metadata(version)
+    with np.load(os.path.join(_version_dir(version), ARRAYS_FILE)) as arrays:
+        forest = CompactForest(**{name: arrays[name] for name in arrays.files})
+
+    scaler = CompactScaler(metadata["scaler"]["mean"], metadata["scaler"]["scale"])
+    return forest, scaler, metadata
+
+
+def load_latest_or_legacy():
+    """Carga la última versión del registro o, si está vacío, el pickle antiguo convertido al formato compacto."""
+    if latest_version() is not None:
+        return load_model()
+
+    import joblib
+    model, scaler = joblib.load(LEGACY_MODEL_PATH)
+    return CompactForest.from_sklearn(model, MODEL_THRESHOLD_DTYPE), scaler, {"version": "legacy", "path": LEGACY_MODEL_PATH}
+
+
+def prune(keep=MODEL_REGISTRY_KEEP):
+    """Elimina las versiones más antiguas, conservando siempre la apuntada por LATEST."""
+    current = latest_version()
+    for version in list_versions()[:-keep]:
+        if version != current:
+            shutil.rmtree(_version_dir(version), ignore_errors=True)
+
+
+def _dir_size(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, files in os.walk(path) for name in files)
+
+
+def benchmark(pickle_path):
+    """Compara tamaño, tiempo de carga y diferencia de predicción del pickle frente al formato compacto."""
+    import joblib
+
+    start = time.perf_counter()
+    model, scaler = joblib.load(pickle_path)
+    pickle_load = time.perf_counter() - start
+    pickle_size = os.path.getsize(pickle_path)
+    print(f"📦 joblib pickle: {pickle_size / 1024 / 1024:.1f} MB, carga en {pickle_load:.2f}s")
+
+    rng = np.random.default_rng(42)
+    X = rng.normal(size=(1000, scaler.n_features_in_))
+    reference = model.predict(X)
+
+    for threshold_dtype in ["float64", "float32", "float16"]:
+        for compress in [False, True]:
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, ARRAYS_FILE)
+                forest = CompactForest.from_sklearn(model, threshold_dtype)
+                (np.savez_compressed if compress else np.savez)(path, **forest.to_arrays())
+
+                start = time.perf_counter()
+                with np.load(path) as arrays:
+                    loaded = CompactForest(**{name: arrays[name] for name in arrays.files})
+                load_time = time.perf_counter() - start
+
+                size = _dir_size(tmp)
+                error = np.abs(loaded.predict(X) - reference).max()
+                print(f"   - {threshold_dtype:<7} {'comprimido' if compress else 'sin comprimir':<13}: "
+                      f"{size / 1024 / 1024:.1f} MB ({pickle_size / size:.1f}x), carga en {load_time:.2f}s "
+                      f"({pickle_load / max(load_time, 1e-9):.1f}x), error máx. {error:.4f} EUR/MWh")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Registro local de modelos de predicción de precios.")
+    parser.add_argument("command", choices=["list", "import", "benchmark"])
+    parser.add_argument("--pickle", default=LEGACY_MODEL_PATH, help="Modelo joblib (model, scaler) a importar o comparar")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        current = latest_version()
+        for version in list_versions():
+            with open(os.path.join(_version_dir(version), METADATA_FILE)) as f:
+                metadata = json.load(f)
+            marker = "⭐" if version == current else "  "
+            print(f"{marker} {version}: {metadata.get('rows')} registros, MAE {metadata.get('mae')}, "
+                  f"{_dir_size(_version_dir(version)) / 1024 / 1024:.1f} MB")
+    elif args.command == "import":
+        import joblib
+        model, scaler = joblib.load(args.pickle)
+        version = save_model(model, scaler, {"source": args.pickle})
+        print(f"✅ {args.pickle} importado como versión {version}")
+    elif args.command == "benchmark":
+        if not os.path.exists(args.pickle):
+            sys.exit(f"❌ No existe {args.pickle}")
+        benchmark(args.pickle)
@@ -0,0 +1,84 @@
+import os
+import logging
+from datetime import datetime
+from dotenv import load_dotenv
+from pymongo import MongoClient
+from data_validation import validate_price_payload
+from drift_monitor import update_prediction_errors
+from price_rollups import update_rollups
+
+# Cargar configuración desde .env
+load_dotenv()
+
+# Configuración de MongoDB
+MONGO_URI = os.getenv("MONGO_URI")
+MONGO_DB = os.getenv("MONGO_DB")
+MONGO_COLLECTION = os.getenv("MONGO_COLLECTION")
+COUNTRY = os.getenv("COUNTRY", "de")  # Alemania por defecto
+BIDDING_ZONE = os.getenv("BIDDING_ZONE", "DE-LU")  # Alemania-Luxemburgo por defecto
+
+# Conectar a MongoDB
+client = MongoClient(MONGO_URI)
+db = client[MONGO_DB]
+collection = db[MONGO_COLLECTION]
+
+
+def log_message(message):
+    """Registrar mensaje en log y consola"""
+    logging.info(message)
+    print(message)
+
+
+def transform_prices(data):
+    """Valida la respuesta de energy-charts y la convierte en registros de MongoDB (sin escribir)."""
+    if not (data and "unix_seconds" in data and "price" in data and "unit" in data):
+        log_message("Estructura de datos inesperada. No se insertaron registros.")
+        return None
+    currency = data["unit"]  # Guardar la unidad (ej. "EUR / MWh")
+
+    # Validar el payload completo antes de escribir: las filas inválidas van a cuarentena
+    validated = validate_price_payload(data)
+    if validated is None:
+        log_message(f"Error: Desajuste entre timestamps ({len(data['unix_seconds'])}) y precios ({len(data['price'])}).")
+        return None
+    timestamps, prices = validated
+
+    return [
+        {
+            "timestamp": datetime.utcfromtimestamp(ts),
+            "price": price,
+            "currency": currency,
+            "country": COUNTRY,
+            "bidding_zone": BIDDING_ZONE
+        }
+        for ts, price in zip(timestamps, prices)
+    ]
+
+
+def write_prices(records):
+    """Inserta los registros que aún no existen y actualiza los agregados y el error del modelo."""
+    # Evitar duplicados con una única consulta por ventana
+    existing = {doc["timestamp"] for doc in collection.find(
+        {"bidding_zone": BIDDING_ZONE, "timestamp": {"$in": [record["timestamp"] for record in records]}},
+        {"_id": 0, "timestamp": 1})} if records else set()
+    processed_data = [record for record in records if record["timestamp"] not in existing]
+
+    if processed_data:
+        collection.insert_many(processed_data)
+        update_prediction_errors(processed_data)
+        log_message(f"Datos insertados correctamente ({len(processed_data)} registros).")
+    else:
+        log_message("No hay datos nuevos para insertar.")
+
+    # Los agregados se recalculan para toda la ventana desde los datos crudos: si una ejecución anterior
+    # falló entre la inserción y este paso, repetir la ventana los repara aunque no haya filas nuevas
+    if records:
+        update_rollups(records)
+    return len(processed_data)
+
+
+def store_prices_in_mongo(data):
+    """Almacena los datos extraídos en MongoDB, incluyendo los precios."""
+    records = transform_prices(data)
+    if records is not None:
+        write_prices(records)
@@ -0,0 +1,120 @@
+import os
+import argparse
+from collections import defaultdict
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from pymongo import MongoClient, ASCENDING
+
+# Cargar configuración desde .env
+load_dotenv()
+
+# Configuración de MongoDB
+MONGO_URI = os.getenv("MONGO_URI")
+MONGO_DB = os.getenv("MONGO_DB")
+MONGO_COLLECTION = os.getenv("MONGO_COLLECTION")
+MONGO_COLLECTION_HOURLY = os.getenv("MONGO_COLLECTION_HOURLY", f"{MONGO_COLLECTION}_hourly")
+MONGO_COLLECTION_DAILY = os.getenv("MONGO_COLLECTION_DAILY", f"{MONGO_COLLECTION}_daily")
+PRICES_CURSOR_BATCH = int(os.getenv("PRICES_CURSOR_BATCH", 5000))  # Documentos por lote al leer de MongoDB
+
+# Conectar a MongoDB
+client = MongoClient(MONGO_URI)
+db = client[MONGO_DB]
+collection = db[MONGO_COLLECTION]
+
+# Colecciones de agregados por resolución y función que calcula el inicio del bucket
+ROLLUPS = {
+    "hourly": (db[MONGO_COLLECTION_HOURLY], lambda ts: ts.replace(minute=0, second=0, microsecond=0), "hour"),
+    "daily": (db[MONGO_COLLECTION_DAILY], lambda ts: ts.replace(hour=0, minute=0, second=0, microsecond=0), "day"),
+}
+
+RESOLUTIONS = ["raw"] + list(ROLLUPS)
+
+_indexes_ready = False
+
+
+def ensure_indexes():
+    """Índices únicos (zona, bucket) de los agregados y (zona, timestamp) de los datos crudos."""
+    global _indexes_ready
+    if _indexes_ready:
+        return
+    collection.create_index([("bidding_zone", ASCENDING), ("timestamp", ASCENDING)])
+    for rollup, _, _ in ROLLUPS.values():
+        rollup.create_index([("bidding_zone", ASCENDING), ("bucket", ASCENDING)], unique=True)
+    _indexes_ready = True
+
+
+def _aggregate_into(rollup, unit, match):
+    """Recalcula desde los datos crudos los buckets de `rollup` que cubren `match` y los sustituye con $merge."""
+    collection.aggregate([
+        {"$match": dict(match, price={"$ne": None})},
+        {"$group": {
+            "_id": {"bidding_zone": "$bidding_zone", "bucket": {"$dateTrunc": {"date": "$timestamp", "unit": unit}}},
+            "min": {"$min": "$price"},
+            "max": {"$max": "$price"},
+            "sum": {"$sum": "$price"},
+            "count": {"$sum": 1},
+        }},
+        {"$project": {"_id": 0, "bidding_zone": "$_id.bidding_zone", "bucket": "$_id.bucket",
+                      "min": 1, "max": 1, "sum": 1, "count": 1, "mean": {"$divide": ["$sum", "$count"]}}},
+        {"$merge": {"into": rollup.name, "on": ["bidding_zone", "bucket"], "whenMatched": "replace"}},
+    ], allowDiskUse=True)
+
+
+def update_rollups(records):
+    """
+    Recalcula los agregados horarios y diarios de los buckets que tocan `records`.
+
+    Cada bucket afectado se reconstruye entero desde los datos crudos, así que la operación es idempotente:
+    repetirla tras una inserción parcial o tras un fallo entre la inserción y este paso deja el mismo resultado,
+    sin perder ni contar dos veces ningún precio. Se puede llamar con todos los registros de una ventana,
+    no solo con los recién insertados.
+    """
+    ensure_indexes()
+    ranges = {}
+    for record in records:
+        zone, ts = record["bidding_zone"], record["timestamp"]
+        first, last = ranges.get(zone, (ts, ts))
+        ranges[zone] = (min(first, ts), max(last, ts))
+
+    for rollup, truncate, unit in ROLLUPS.values():
+        for zone, (first, last) in ranges.items():
+            end = truncate(last) + timedelta(**{f"{unit}s": 1})
+            _aggregate_into(rollup, unit, {"bidding_zone": zone, "timestamp": {"$gte": truncate(first), "$lt": end}})
+
+
+def rebuild_rollups():
+    """Recalcula todos los agregados desde los datos crudos con una agregación en el servidor."""
+    ensure_indexes()
+    for name, (rollup, _, unit) in ROLLUPS.items():
+        rollup.delete_many({})
+        _aggregate_into(rollup, unit, {})
+        print(f"✅ Agregado {name} reconstruido: {rollup.count_documents({})} buckets.")
+
+
+def iter_prices(zone, start, end, resolution="raw"):
+    """Generador de precios en [start, end) para una zona, leídos por lotes desde MongoDB."""
+    if resolution == "raw":
+        cursor = collection.find({"bidding_zone": zone, "timestamp": {"$gte": start, "$lt": end}},
+                                 {"_id": 0, "timestamp": 1, "price": 1, "currency": 1})
+        cursor = cursor.sort("timestamp", ASCENDING).batch_size(PRICES_CURSOR_BATCH)
+        for doc in cursor:
+            yield {"timestamp": doc["timestamp"].isoformat(), "price": doc.get("price"), "currency": doc.get("currency")}
+        return
+
+    rollup = ROLLUPS[resolution][0]
+    cursor = rollup.find({"bidding_zone": zone, "bucket": {"$gte": start, "$lt": end}},
+                         {"_id": 0, "bucket": 1, "min": 1, "max": 1, "mean": 1, "count": 1})
+    cursor = cursor.sort("bucket", ASCENDING).batch_size(PRICES_CURSOR_BATCH)
+    for doc in cursor:
+        yield {"timestamp": doc["bucket"].isoformat(), "min": doc["min"], "max": doc["max"],
+               "mean": doc["mean"], "count": doc["count"]}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mantenimiento de los agregados de precios.")
+    parser.add_argument("command", choices=["rebuild"])
+    args = parser.parse_args()
+
+    if args.command == "rebuild":
+        print(f"🔄 Reconstruyendo agregados desde {MONGO_COLLECTION} ({datetime.utcnow().isoformat()})...")
+        rebuild_rollups()
@@ -1,8 +1,9 @@
-import joblib
+import os
 import numpy as np
 import pandas as pd
 from pymongo import MongoClient
 from sklearn.metrics import mean_absolute_error
+from model_registry import load_latest_or_legacy, parse_quantiles, feature_origin, days_since_start
 
 # Conectar a MongoDB
 MONGO_URI = "mongodb://mongo:27017/"
@@ -15,13 +16,19 @@ db = client[MONGO_DB]
 collection_energy = db[MONGO_COLLECTION_ENERGY]
 collection_meteo = db[MONGO_COLLECTION_METEO]
 
-# Cargar el modelo entrenado
-MODEL_PATH = "models/energy_price_model.pkl"
-model, scaler = joblib.load(MODEL_PATH)
+# Cargar el último modelo publicado en el registro
+model, scaler, metadata = load_latest_or_legacy()
+print(f"📦 Evaluando modelo versión {metadata['version']}")
 
 # Número de registros a evaluar
 SAMPLE_SIZE = 500
 
+# Cuantiles del intervalo de predicción a calcular (vacío = solo predicción puntual)
+PREDICTION_QUANTILES = parse_quantiles(os.getenv("PREDICTION_QUANTILES", "0.1,0.9"))
+if not model.supports_intervals:
+    print("⚠️ El modelo es gradient boosting: se evalúa solo la predicción puntual.")
+    PREDICTION_QUANTILES = ()
+
 # Obtener datos históricos de MongoDB
 energy_data = list(collection_energy.find({}, {"_id": 0, "timestamp": 1, "price": 1}).limit(SAMPLE_SIZE))
 meteo_data = list(collection_meteo.find({}, {"_id": 0, "timestamp": 1, "temperature": 1, "humidity": 1,
@@ -45,8 +52,8 @@ if df_merged.empty:
     print("⚠️ No hay datos disponibles después de la fusión. Abortando.")
     exit()
 
-# Calcular "days_since_start" usando el mismo método que en el entrenamiento
-df_merged["days_since_start"] = (df_merged["timestamp"] - df_merged["timestamp"].min()).dt.days
+# Calcular "days_since_start" con el mismo origen que el entrenamiento del modelo
+df_merged["days_since_start"] = days_since_start(df_merged["timestamp"], feature_origin(metadata, df_merged["timestamp"].min()))
 
 # Separar X (variables predictoras) e y (precio real)
 X = df_merged.drop(columns=["timestamp", "price"])
@@ -60,8 +67,9 @@ if X.shape[1] != expected_features:
 # Normalizar X usando el mismo scaler del entrenamiento
 X_scaled = scaler.transform(X)
 
-# Realizar predicciones
-y_pred = model.predict(X_scaled)
+# Realizar predicciones (media y cuantiles en una sola pasada sobre los árboles)
+prediction = model.predict_distribution(X_scaled, PREDICTION_QUANTILES, with_std=model.supports_intervals)
+y_pred = prediction["mean"]
 
 # Calcular el error absoluto medio (MAE)
 mae = mean_absolute_error(y_real, y_pred)
@@ -71,8 +79,18 @@ result_df = pd.DataFrame({
     "timestamp": df_merged["timestamp"],
     "price_real": y_real,
     "price_predicho": y_pred,
-    "error": abs(y_real - y_pred)
+    "error": abs(y_real - y_pred),
 })
+if "std" in prediction:
+    result_df["price_std"] = prediction["std"]
+for q, values in prediction.get("quantiles", {}).items():
+    result_df[f"price_q{q:g}"] = values
+
+# Cobertura del intervalo entre el cuantil más bajo y el más alto
+if len(PREDICTION_QUANTILES) >= 2:
+    lower, upper = prediction["quantiles"][min(PREDICTION_QUANTILES)], prediction["quantiles"][max(PREDICTION_QUANTILES)]
+    coverage = np.mean((y_real.to_numpy() >= lower) & (y_real.to_numpy() <= upper)) * 100
+    print(f"📏 Cobertura del intervalo [{min(PREDICTION_QUANTILES):g}, {max(PREDICTION_QUANTILES):g}]: {coverage:.1f}%")
 
 # Guardar los resultados en un archivo CSV
 result_df.to_csv("model_validation_results.csv", index=False)
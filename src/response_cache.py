@@ -0,0 +1,195 @@
+import os
+import sys
+import gzip
+import json
+import atexit
+import hashlib
+import logging
+import argparse
+import subprocess
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+
+# Cargar configuración desde .env
+load_dotenv()
+
+# Configuración de la caché de respuestas crudas
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_DIR = os.getenv("RESPONSE_CACHE_DIR", "cache/responses")
+RESPONSE_CACHE_MAX_MB = int(os.getenv("RESPONSE_CACHE_MAX_MB", 1024))  # Tamaño máximo en disco
+RESPONSE_CACHE_IMMUTABLE_DAYS = int(os.getenv("RESPONSE_CACHE_IMMUTABLE_DAYS", 5))  # Antigüedad a partir de la cual una ventana ya no cambia
+RESPONSE_CACHE_OFFLINE = os.getenv("RESPONSE_CACHE_OFFLINE", "false").lower() == "true"  # Reproducir solo desde disco, sin red
+
+# Estadísticas de la ejecución actual
+stats = {"hits": 0, "misses": 0, "refreshes": 0, "offline_misses": 0, "stores": 0, "evictions": 0}
+
+# Indica si la última consulta se sirvió desde disco (para omitir esperas entre peticiones)
+last_lookup_hit = False
+
+_current_size = None
+
+
+def log_message(message):
+    """Registrar mensaje en log y consola"""
+    logging.info(message)
+    print(message)
+
+
+def cache_key(endpoint, params):
+    """Clave de contenido: hash del endpoint y de los parámetros normalizados."""
+    payload = json.dumps({"endpoint": endpoint, "params": params}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _entry_path(key):
+    return os.path.join(RESPONSE_CACHE_DIR, key[:2], f"{key}.json.gz")
+
+
+def _immutable_since(end_date):
+    """Fecha a partir de la cual la ventana que termina en `end_date` se considera inmutable."""
+    return datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=RESPONSE_CACHE_IMMUTABLE_DAYS)
+
+
+def _iter_entries():
+    if not os.path.isdir(RESPONSE_CACHE_DIR):
+        return
+    for shard in os.scandir(RESPONSE_CACHE_DIR):
+        if shard.is_dir():
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith(".json.gz"):
+                    yield entry
+
+
+def _cache_size():
+    global _current_size
+    if _current_size is None:
+        _current_size = sum(entry.stat().st_size for entry in _iter_entries())
+    return _current_size
+
+
+def get(key):
+    """Lee una entrada de la caché (o None). Actualiza su fecha de acceso para la política LRU."""
+    path = _entry_path(key)
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            entry = json.load(f)
+        os.utime(path)
+        return entry
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        log_message(f"⚠️ Entrada de caché corrupta {key}, se descarta: {e}")
+        os.remove(path)
+        return None
+
+
+def put(key, endpoint, params, data):
+    """Guarda una respuesta comprimida de forma atómica y aplica el límite de tamaño."""
+    global _current_size
+    path = _entry_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    entry = {"endpoint": endpoint, "params": params, "fetched_at": datetime.utcnow().isoformat(), "data": data}
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+        json.dump(entry, f, default=str)
+
+    previous_size = os.path.getsize(path) if os.path.exists(path) else 0
+    os.replace(tmp_path, path)
+    _current_size = _cache_size() - previous_size + os.path.getsize(path)
+    stats["stores"] += 1
+
+    if _current_size > RESPONSE_CACHE_MAX_MB * 1024 * 1024:
+        evict()
+
+
+def evict(target_ratio=0.9):
+    """Elimina las entradas usadas hace más tiempo hasta quedar por debajo del límite."""
+    global _current_size
+    limit = RESPONSE_CACHE_MAX_MB * 1024 * 1024 * target_ratio
+    entries = sorted(_iter_entries(), key=lambda entry: entry.stat().st_mtime)
+    size = sum(entry.stat().st_size for entry in entries)
+
+    for entry in entries:
+        if size <= limit:
+            break
+        size -= entry.stat().st_size
+        os.remove(entry.path)
+        stats["evictions"] += 1
+
+    _current_size = size
+
+
+def cached_fetch(endpoint, params, end_date, fetch):
+    """
+    Devuelve la respuesta cruda de `fetch()` pasando por la caché en disco.
+
+    Las ventanas inmutables (terminadas hace más de RESPONSE_CACHE_IMMUTABLE_DAYS días y descargadas
+    después de esa fecha) se sirven desde disco. En modo offline se sirve cualquier entrada disponible
+    y nunca se accede a la red.
+    """
+    global last_lookup_hit
+    last_lookup_hit = False
+
+    if not RESPONSE_CACHE_ENABLED:
+        return fetch()
+
+    key = cache_key(endpoint, params)
+    entry = get(key)
+
+    if entry is not None:
+        complete = datetime.fromisoformat(entry["fetched_at"]) >= _immutable_since(end_date)
+        if RESPONSE_CACHE_OFFLINE or complete:
+            stats["hits"] += 1
+            last_lookup_hit = True
+            return entry["data"]
+
+    if RESPONSE_CACHE_OFFLINE:
+        stats["offline_misses"] += 1
+        log_message(f"⚠️ Modo offline: sin respuesta en caché para {endpoint} {params}")
+        return None
+
+    stats["refreshes" if entry is not None else "misses"] += 1
+    data = fetch()
+    if data is not None:
+        put(key, endpoint, params, data)
+    return data
+
+
+def log_cache_stats():
+    """Muestra la tasa de aciertos de la caché en esta ejecución."""
+    lookups = stats["hits"] + stats["misses"] + stats["refreshes"] + stats["offline_misses"]
+    if lookups == 0:
+        return
+    hit_rate = stats["hits"] / lookups * 100
+    log_message(f"💾 Caché de respuestas: {stats['hits']}/{lookups} aciertos ({hit_rate:.1f}%), "
+                f"{stats['misses']} fallos, {stats['refreshes']} refrescos, {stats['offline_misses']} fallos offline, "
+                f"{stats['stores']} guardadas, {stats['evictions']} expulsadas, {_cache_size() / 1024 / 1024:.1f} MB en disco.")
+
+
+atexit.register(log_cache_stats)
+
+
+def replay():
+    """Reconstruye la ingesta histórica y el modelo únicamente desde la caché, sin red."""
+    env = dict(os.environ, RESPONSE_CACHE_OFFLINE="true", SLEEP_TIME="0", METEO_SLEEP_TIME="0")
+    for script in ["src/historical_data_ingestion.py", "src/historical_data_ingestion_meteo.py", "src/train_model_batch.py"]:
+        log_message(f"🔁 Reproduciendo {script} desde la caché...")
+        subprocess.run([sys.executable, script], check=True, env=env)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gestión de la caché de respuestas crudas de las APIs.")
+    parser.add_argument("command", choices=["stats", "evict", "replay"])
+    args = parser.parse_args()
+
+    if args.command == "stats":
+        entries = list(_iter_entries())
+        log_message(f"💾 {len(entries)} respuestas en {RESPONSE_CACHE_DIR}, {_cache_size() / 1024 / 1024:.1f} MB "
+                    f"(límite {RESPONSE_CACHE_MAX_MB} MB).")
+    elif args.command == "evict":
+        evict()
+        log_message(f"🧹 {stats['evictions']} entradas expulsadas, {_cache_size() / 1024 / 1024:.1f} MB en disco.")
+    elif args.command == "replay":
+        replay()
+        log_message("🏁 Pipeline reconstruido desde la caché.")
@@ -1,12 +1,14 @@
 import os
-import joblib
 import pandas as pd
 import numpy as np
 from pymongo import MongoClient
 from datetime import datetime
 from dotenv import load_dotenv
-from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import mean_absolute_error
 from sklearn.preprocessing import StandardScaler
+from model_registry import save_model, days_since_start
+from drift_monitor import reference_stats
+from tune_model import build_model, load_best_params, save_training_matrix, TUNING_VALIDATION_FRACTION
 
 # Cargar configuración desde .env
 load_dotenv()
@@ -16,7 +18,6 @@ MONGO_URI = os.getenv("MONGO_URI")
 MONGO_DB = os.getenv("MONGO_DB")
 MONGO_COLLECTION_ENERGY = os.getenv("MONGO_COLLECTION")  # Datos de energía
 MONGO_COLLECTION_METEO = os.getenv("MONGO_COLLECTION_METEO")  # Datos meteorológicos
-MODEL_PATH = "models/energy_price_model.pkl"
 BATCH_SIZE = 50000  # Tamaño del lote
 
 # Conectar a MongoDB
@@ -65,20 +66,34 @@ def fetch_data_in_batches():
 
 def train_model():
     """Entrena un modelo con pesos temporales para dar más importancia a los datos recientes."""
-    model = RandomForestRegressor(n_estimators=150, max_depth=None, random_state=42, n_jobs=-1)
+    # Configuración encontrada por tune_model.py (o la de siempre: 150 árboles sin límite de profundidad)
+    config = load_best_params()
+    print(f"⚙️ Configuración del modelo: {config['family']} {config['params']}")
+    # oob_score permite medir el MAE fuera de muestra sin reservar datos de validación
+    model = build_model(config, oob_score=True)
     scaler = StandardScaler()  # Normalización de datos
 
     X_total = []
     y_total = []
     time_weights = []
+    timestamps = []
+    window_start, window_end = None, None
 
     batch_count = 0  # Contador de lotes
 
+    # Origen único de days_since_start para todos los lotes; se guarda en los metadatos para que la
+    # predicción calcule la variable en la misma escala
+    first = collection_energy.find_one({}, {"_id": 0, "timestamp": 1}, sort=[("timestamp", 1)])
+    if first is None:
+        print("⚠️ No hay precios en MongoDB, no se entrena el modelo.")
+        return
+    origin = first["timestamp"]
+
     for df_batch in fetch_data_in_batches():
         batch_count += 1
 
         # Agregar la variable de tiempo "days_since_start"
-        df_batch["days_since_start"] = (df_batch["timestamp"] - df_batch["timestamp"].min()).dt.days
+        df_batch["days_since_start"] = days_since_start(df_batch["timestamp"], origin)
 
         # Seleccionar todas las características, incluyendo days_since_start
         X = df_batch.drop(columns=["timestamp", "price"])
@@ -94,10 +109,16 @@ def train_model():
             print("⚠️ Se detectó un lote vacío después de limpiar NaNs, saltando...")
             continue
 
+        # Registrar la ventana temporal de entrenamiento
+        batch_start, batch_end = df_batch["timestamp"].min(), df_batch["timestamp"].max()
+        window_start = batch_start if window_start is None else min(window_start, batch_start)
+        window_end = batch_end if window_end is None else max(window_end, batch_end)
+
         # Acumular datos para el entrenamiento
         X_total.append(X)
         y_total.append(y)
         time_weights.append(df_batch["days_since_start"].to_numpy())
+        timestamps.append(df_batch["timestamp"].to_numpy())
 
     if batch_count == 0:
         print("⚠️ No se entrenó el modelo porque no se procesaron lotes.")
@@ -107,17 +128,43 @@ def train_model():
     X_train = np.vstack([df.to_numpy() for df in X_total])
     y_train = np.hstack([df.to_numpy() for df in y_total])
     time_weights_train = np.hstack(time_weights)  # Unir los pesos temporales
+    features = list(X_total[0].columns)
+
+    # Guardar la matriz para que tune_model.py pueda buscar hiperparámetros sin releer MongoDB
+    save_training_matrix(X_train, y_train, time_weights_train, np.hstack(timestamps), features)
 
     print(f"🔄 Entrenando modelo final con {len(X_train)} registros...")
     X_train_scaled = scaler.fit_transform(X_train)  # Normalizar datos
 
-    # Entrenar RandomForest con `sample_weight`
-    model.fit(X_train_scaled, y_train, sample_weight=time_weights_train)
-
-    # Guardar el modelo entrenado
-    os.makedirs("models", exist_ok=True)
-    joblib.dump((model, scaler), MODEL_PATH)
-    print(f"✅ Modelo entrenado y guardado en {MODEL_PATH} con {batch_count} lotes.")
+    if config["family"] == "boosting":
+        # Sin OOB: MAE sobre las filas más recientes con un modelo que no las ha visto, luego reentrenar con todo
+        order = np.argsort(np.hstack(timestamps), kind="stable")
+        n_fit = int(len(order) * (1 - TUNING_VALIDATION_FRACTION))
+        fit_idx, valid_idx = order[:n_fit], order[n_fit:]
+        model.fit(X_train_scaled[fit_idx], y_train[fit_idx], sample_weight=time_weights_train[fit_idx])
+        mae = mean_absolute_error(y_train[valid_idx], model.predict(X_train_scaled[valid_idx]))
+        print(f"📊 MAE de validación (últimas filas): {mae:.2f} EUR/MWh")
+        model = build_model(config)
+        model.fit(X_train_scaled, y_train, sample_weight=time_weights_train)
+    else:
+        # Entrenar RandomForest con `sample_weight`
+        model.fit(X_train_scaled, y_train, sample_weight=time_weights_train)
+        mae = mean_absolute_error(y_train, model.oob_prediction_)
+        print(f"📊 MAE fuera de muestra (OOB): {mae:.2f} EUR/MWh")
+
+    # Publicar el modelo entrenado en el registro
+    metadata = {
+        "training_window": {"start": window_start.isoformat(), "end": window_end.isoformat()},
+        "days_since_start_origin": origin.isoformat(),
+        "rows": int(len(X_train)),
+        "mae": round(float(mae), 4),
+        "features": features,
+        "params": model.get_params(),
+        # Distribución de referencia para detectar deriva en los datos nuevos
+        "feature_stats": reference_stats(X_train, features, np.hstack(timestamps)),
+    }
+    version = save_model(model, scaler, metadata)
+    print(f"✅ Modelo entrenado y publicado como versión {version} con {batch_count} lotes.")
 
 if __name__ == "__main__":
     print("🚀 Entrenando modelo por lotes con pesos temporales...")
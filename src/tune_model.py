@@ -0,0 +1,287 @@
+import os
+import json
+import math
+import time
+import random
+import argparse
+import multiprocessing
+from datetime import datetime
+from io import BytesIO
+import numpy as np
+from dotenv import load_dotenv
+from sklearn.ensemble import GradientBoostingRegressor, RandomForestRegressor
+from sklearn.metrics import mean_absolute_error
+from model_registry import CompactForest, MODEL_COMPRESS, MODEL_THRESHOLD_DTYPE
+
+# Cargar configuración desde .env
+load_dotenv()
+
+# Ficheros compartidos con train_model_batch.py
+TRAINING_MATRIX_PATH = os.getenv("TRAINING_MATRIX_PATH", "models/training_matrix.npz")
+TUNING_PARAMS_PATH = os.getenv("TUNING_PARAMS_PATH", "models/best_params.json")
+
+# Presupuesto y búsqueda
+TUNING_TIME_BUDGET = int(os.getenv("TUNING_TIME_BUDGET", 1800))  # Segundos de reloj para toda la búsqueda
+TUNING_CPU_BUDGET = int(os.getenv("TUNING_CPU_BUDGET", 0))  # Segundos de CPU sumando todos los trials (0 = sin límite)
+TUNING_WORKERS = int(os.getenv("TUNING_WORKERS", os.cpu_count() or 1))
+TUNING_ETA = int(os.getenv("TUNING_ETA", 3))  # Factor de reducción de successive halving
+TUNING_MIN_ROWS = int(os.getenv("TUNING_MIN_ROWS", 2000))  # Filas de entrenamiento del escalón más barato
+TUNING_VALIDATION_FRACTION = float(os.getenv("TUNING_VALIDATION_FRACTION", 0.2))  # Últimas filas (por tiempo) para validar
+
+# Objetivo = MAE + peso_latencia * ms por predicción + peso_tamaño * MB del artefacto (todo en EUR/MWh)
+TUNING_LATENCY_WEIGHT = float(os.getenv("TUNING_LATENCY_WEIGHT", 1.0))
+TUNING_SIZE_WEIGHT = float(os.getenv("TUNING_SIZE_WEIGHT", 0.02))
+LATENCY_REPEATS = 30
+
+# Configuración usada hasta ahora por el entrenamiento programado
+DEFAULT_CONFIG = {"family": "forest", "params": {"n_estimators": 150, "max_depth": None}}
+
+SEARCH_SPACE = {
+    "forest": {
+        "n_estimators": [25, 50, 100, 150, 300],
+        "max_depth": [8, 12, 16, 24, None],
+        "min_samples_leaf": [1, 2, 5, 10, 20],
+        "max_features": [1.0, 0.7, 0.5, "sqrt"],
+    },
+    "boosting": {
+        "n_estimators": [100, 200, 400, 800],
+        "learning_rate": [0.03, 0.05, 0.1, 0.2],
+        "max_depth": [3, 4, 6, 8],
+        "min_samples_leaf": [1, 10, 50],
+        "subsample": [0.6, 0.8, 1.0],
+    },
+}
+
+
+def build_model(config, n_jobs=-1, oob_score=False):
+    """Crea el estimador de una configuración {"family", "params"}."""
+    if config["family"] == "boosting":
+        return GradientBoostingRegressor(random_state=42, **config["params"])
+    return RandomForestRegressor(random_state=42, n_jobs=n_jobs, oob_score=oob_score, **config["params"])
+
+
+def load_best_params(path=TUNING_PARAMS_PATH):
+    """Mejor configuración encontrada por la búsqueda o, si no existe, la configuración por defecto."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return DEFAULT_CONFIG
+
+
+def save_training_matrix(X, y, weights, timestamps, features, path=TRAINING_MATRIX_PATH):
+    """Guarda la matriz de entrenamiento (sin escalar) para que la búsqueda no tenga que releer MongoDB."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez(tmp_path, X=X, y=y, weights=weights, timestamps=timestamps.astype("datetime64[s]"),
+             features=np.array(features))
+    os.replace(tmp_path, path)
+
+
+def split_training_matrix(path):
+    """Carga la matriz y la separa por tiempo: las últimas TUNING_VALIDATION_FRACTION filas se usan para validar."""
+    with np.load(path) as data:
+        order = np.argsort(data["timestamps"], kind="stable")
+        X, y, weights = data["X"][order], data["y"][order], data["weights"][order]
+    n_train = int(len(X) * (1 - TUNING_VALIDATION_FRACTION))
+    return X[:n_train], y[:n_train], weights[:n_train], X[n_train:], y[n_train:]
+
+
+def sample_config(rng):
+    family = rng.choice(sorted(SEARCH_SPACE))
+    return {"family": family, "params": {name: rng.choice(values) for name, values in SEARCH_SPACE[family].items()}}
+
+
+def objective(trial):
+    return trial["mae"] + TUNING_LATENCY_WEIGHT * trial["predict_ms"] + TUNING_SIZE_WEIGHT * trial["size_mb"]
+
+
+# Datos del proceso worker, cargados una sola vez por el initializer del pool
+_matrix = None
+
+
+def _init_worker(path):
+    global _matrix
+    _matrix = split_training_matrix(path)
+
+
+def evaluate(config, rows):
+    """
+    Entrena una configuración con las `rows` filas de entrenamiento más recientes y la mide tal como se serviría:
+    MAE de validación, latencia de una predicción y tamaño del artefacto compacto.
+
+    Los árboles no dependen de la escala de las variables, así que se entrena sin StandardScaler.
+    """
+    X_train, y_train, w_train, X_valid, y_valid = _matrix
+    start_cpu = time.process_time()
+    start = time.perf_counter()
+
+    model = build_model(config, n_jobs=1)
+    model.fit(X_train[-rows:], y_train[-rows:], sample_weight=w_train[-rows:])
+    forest = CompactForest.from_sklearn(model, MODEL_THRESHOLD_DTYPE)
+    fit_seconds = time.perf_counter() - start
+
+    mae = mean_absolute_error(y_valid, forest.predict(X_valid))
+
+    sample = X_valid[:1]
+    timings = []
+    for _ in range(LATENCY_REPEATS):
+        t0 = time.perf_counter()
+        forest.predict(sample)
+        timings.append(time.perf_counter() - t0)
+
+    buffer = BytesIO()
+    (np.savez_compressed if MODEL_COMPRESS else np.savez)(buffer, **forest.to_arrays())
+
+    trial = {"config": config, "rows": rows, "mae": float(mae), "predict_ms": float(np.median(timings) * 1000),
+             "size_mb": buffer.tell() / 1024 / 1024, "fit_seconds": fit_seconds,
+             "cpu_seconds": time.process_time() - start_cpu}
+    trial["objective"] = objective(trial)
+    return trial
+
+
+class Budget:
+    """Presupuesto de reloj y de CPU compartido por todos los trials de la búsqueda."""
+
+    def __init__(self, seconds, cpu_seconds):
+        self.deadline = time.monotonic() + seconds
+        self.cpu_seconds = cpu_seconds
+        self.cpu_used = 0.0
+
+    def remaining(self):
+        return self.deadline - time.monotonic()
+
+    def exhausted(self):
+        return self.remaining() <= 0 or (self.cpu_seconds and self.cpu_used >= self.cpu_seconds)
+
+
+def run_rung(pool, configs, rows, budget):
+    """Lanza un escalón de trials en el pool y devuelve los que terminan dentro del presupuesto."""
+    pending = [pool.apply_async(evaluate, (config, rows)) for config in configs]
+    results = []
+    while pending and not budget.exhausted():
+        time.sleep(0.1)
+        for result in [r for r in pending if r.ready()]:
+            pending.remove(result)
+            try:
+                trial = result.get()
+            except Exception as e:
+                print(f"⚠️ Trial fallido: {e}")
+                continue
+            budget.cpu_used += trial["cpu_seconds"]
+            results.append(trial)
+            print(f"   🧪 {trial['config']['family']:<8} {trial['rows']:>8} filas | MAE {trial['mae']:.2f} | "
+                  f"{trial['predict_ms']:.2f} ms | {trial['size_mb']:.1f} MB | objetivo {trial['objective']:.2f} | "
+                  f"{trial['config']['params']}")
+    return results, bool(pending)
+
+
+def successive_halving(pool, configs, min_rows, max_rows, budget, eta=TUNING_ETA):
+    """
+    Evalúa todas las configuraciones con pocas filas y promociona el mejor 1/eta al siguiente escalón
+    (eta veces más filas) hasta llegar a todos los datos de entrenamiento.
+    """
+    trials = []
+    rows = min_rows
+    while configs:
+        results, interrupted = run_rung(pool, configs, int(rows), budget)
+        trials += results
+        if interrupted or rows >= max_rows or not results:
+            break
+        results.sort(key=lambda trial: trial["objective"])
+        configs = [trial["config"] for trial in results[:max(1, len(results) // eta)]]
+        # Redondeo: el último escalón debe usar exactamente todas las filas
+        rows = max_rows if rows * eta >= max_rows - 1 else rows * eta
+    return trials
+
+
+def hyperband(pool, max_rows, budget, rng, eta=TUNING_ETA):
+    """
+    Hyperband: varios brackets de successive halving, desde muchas configuraciones con pocas filas hasta
+    pocas configuraciones con todas las filas, para no depender de un único punto de partida.
+    """
+    s_max = max(0, int(math.log(max_rows / TUNING_MIN_ROWS, eta)))
+    trials = []
+    for s in range(s_max, -1, -1):
+        if budget.exhausted():
+            break
+        n_configs = int(math.ceil((s_max + 1) / (s + 1) * eta ** s))
+        min_rows = max_rows / eta ** s
+        print(f"🎰 Bracket s={s}: {n_configs} configuraciones desde {int(min_rows)} filas")
+        trials += successive_halving(pool, [sample_config(rng) for _ in range(n_configs)], min_rows, max_rows, budget, eta)
+    return trials
+
+
+def tune(method="hyperband", time_budget=TUNING_TIME_BUDGET, cpu_budget=TUNING_CPU_BUDGET,
+         workers=TUNING_WORKERS, n_configs=None, seed=42, write=True):
+    """Ejecuta la búsqueda sobre la matriz cacheada y guarda la mejor configuración entrenada con todas las filas."""
+    if not os.path.exists(TRAINING_MATRIX_PATH):
+        raise FileNotFoundError(f"No existe {TRAINING_MATRIX_PATH}: ejecuta antes train_model_batch.py.")
+
+    with np.load(TRAINING_MATRIX_PATH) as data:
+        max_rows = int(len(data["y"]) * (1 - TUNING_VALIDATION_FRACTION))
+    rng = random.Random(seed)
+    budget = Budget(time_budget, cpu_budget)
+    print(f"🔍 Búsqueda {method} sobre {max_rows} filas de entrenamiento con {workers} procesos "
+          f"(presupuesto {time_budget}s de reloj, {cpu_budget or '∞'} s de CPU)")
+
+    pool = multiprocessing.Pool(workers, initializer=_init_worker, initargs=(TRAINING_MATRIX_PATH,))
+    try:
+        # Referencia: la configuración actual con todas las filas, en paralelo con la búsqueda
+        baseline = pool.apply_async(evaluate, (DEFAULT_CONFIG, max_rows))
+        if method == "hyperband":
+            trials = hyperband(pool, max_rows, budget, rng)
+        else:
+            s_max = max(0, int(math.log(max_rows / TUNING_MIN_ROWS, TUNING_ETA)))
+            configs = [sample_config(rng) for _ in range(n_configs or TUNING_ETA ** s_max)]
+            trials = successive_halving(pool, configs, max_rows / TUNING_ETA ** s_max, max_rows, budget)
+        baseline.wait(max(0, budget.remaining()))
+        if baseline.ready() and baseline.successful():
+            trials.append(baseline.get())
+            budget.cpu_used += trials[-1]["cpu_seconds"]
+    finally:
+        # Terminar también los trials en curso si se agotó el presupuesto
+        pool.terminate()
+        pool.join()
+
+    # Solo son comparables los trials entrenados con todas las filas
+    final = sorted((trial for trial in trials if trial["rows"] == max_rows), key=lambda trial: trial["objective"])
+    if not final:
+        print("⚠️ Ningún trial llegó a entrenarse con todas las filas dentro del presupuesto.")
+        return None
+
+    baseline = next((trial for trial in final if trial["config"] == DEFAULT_CONFIG), None)
+    print(f"\n🏆 Mejores configuraciones ({len(trials)} trials, {budget.cpu_used:.0f}s de CPU):")
+    for trial in final[:5]:
+        print(f"   - objetivo {trial['objective']:.2f} | MAE {trial['mae']:.2f} | {trial['predict_ms']:.2f} ms | "
+              f"{trial['size_mb']:.1f} MB | entrenamiento {trial['fit_seconds']:.1f}s | {trial['config']}")
+    if baseline:
+        print(f"📌 Configuración actual: objetivo {baseline['objective']:.2f} | MAE {baseline['mae']:.2f} | "
+              f"{baseline['predict_ms']:.2f} ms | {baseline['size_mb']:.1f} MB | entrenamiento {baseline['fit_seconds']:.1f}s")
+
+    best = final[0]
+    result = dict(best["config"], mae=best["mae"], predict_ms=best["predict_ms"], size_mb=best["size_mb"],
+                  objective=best["objective"], rows=max_rows, trials=len(trials), method=method,
+                  tuned_at=datetime.utcnow().isoformat())
+    if write:
+        os.makedirs(os.path.dirname(TUNING_PARAMS_PATH) or ".", exist_ok=True)
+        tmp_path = f"{TUNING_PARAMS_PATH}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(result, f, indent=2)
+        os.replace(tmp_path, TUNING_PARAMS_PATH)
+        print(f"✅ Mejor configuración guardada en {TUNING_PARAMS_PATH}, el próximo entrenamiento la usará.")
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Búsqueda de hiperparámetros con presupuesto (successive halving / Hyperband).")
+    parser.add_argument("--method", choices=["hyperband", "halving"], default="hyperband")
+    parser.add_argument("--budget", type=int, default=TUNING_TIME_BUDGET, help="Segundos de reloj")
+    parser.add_argument("--cpu-budget", type=int, default=TUNING_CPU_BUDGET, help="Segundos de CPU sumados (0 = sin límite)")
+    parser.add_argument("--workers", type=int, default=TUNING_WORKERS, help="Procesos del pool")
+    parser.add_argument("--configs", type=int, help="Configuraciones iniciales con --method halving")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--dry-run", action="store_true", help="No guardar la mejor configuración")
+    args = parser.parse_args()
+
+    tune(args.method, args.budget, args.cpu_budget, args.workers, args.configs, args.seed, write=not args.dry_run)
@@ -16,6 +16,7 @@ from dotenv import load_dotenv
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+from response_cache import cached_fetch
 
 # Cargar configuración desde .env
 load_dotenv()
@@ -73,6 +74,12 @@ def log_message(message):
     print(message)
 
 def navigate_and_extract(bidding_zone, start_date, end_date):
+    """Obtiene los precios de energy-charts, sirviendo las ventanas ya descargadas desde la caché en disco."""
+    params = {"bzn": bidding_zone, "start": start_date, "end": end_date}
+    return cached_fetch("energy-charts/price", params, end_date,
+                        lambda: download_prices(bidding_zone, start_date, end_date))
+
+def download_prices(bidding_zone, start_date, end_date):
 
     browser = None
 
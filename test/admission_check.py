@@ -0,0 +1,81 @@
+"""
+Comprobación del control de admisión cuando las peticiones agotan su plazo.
+
+Un handler síncrono sigue ocupando su hilo del threadpool aunque el middleware ya haya respondido 504, así que el
+turno no puede liberarse hasta que el handler termina. Lanza una ráfaga contra un endpoint lento con plazo corto
+y falla si en algún momento se ejecutan más handlers a la vez que `max_inflight`.
+
+Ejemplo:
+    python test/admission_check.py --max-inflight 2 --timeout 0.3 --handler-seconds 1 --requests 12
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import threading
+from collections import Counter
+import httpx
+from fastapi import FastAPI
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+from admission_control import AdmissionController, AdmissionMiddleware  # noqa: E402
+
+
+def build_app(controller, handler_seconds):
+    app = FastAPI()
+    app.add_middleware(AdmissionMiddleware, controller=controller)
+    lock = threading.Lock()
+    state = {"running": 0, "peak": 0, "finished": 0}
+
+    @app.post("/predict/")
+    def slow_predict():
+        with lock:
+            state["running"] += 1
+            state["peak"] = max(state["peak"], state["running"])
+        time.sleep(handler_seconds)
+        with lock:
+            state["running"] -= 1
+            state["finished"] += 1
+        return {"ok": True}
+
+    return app, state
+
+
+async def run_check(max_inflight, timeout, handler_seconds, requests):
+    controller = AdmissionController(paths=["/predict/"], max_inflight=max_inflight, max_queue=requests,
+                                     timeout=timeout, enabled=True)
+    app, state = build_app(controller, handler_seconds)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://check", timeout=30) as client:
+        statuses = Counter()
+        # Varias oleadas: cada una llega cuando la anterior ya recibió su 504 pero sus handlers siguen corriendo
+        for _ in range(3):
+            responses = await asyncio.gather(*(client.post("/predict/") for _ in range(requests // 3)))
+            statuses.update(response.status_code for response in responses)
+
+        # Esperar a que terminen los handlers que siguen en el threadpool
+        while controller.inflight:
+            await asyncio.sleep(0.05)
+
+    print(f"📊 Respuestas: {dict(statuses)} | pico de handlers simultáneos: {state['peak']} "
+          f"(máximo permitido {max_inflight}) | handlers terminados: {state['finished']}")
+    return state["peak"] <= max_inflight and statuses.get(504, 0) > 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-inflight", type=int, default=2)
+    parser.add_argument("--timeout", type=float, default=0.3, help="Plazo por petición en segundos")
+    parser.add_argument("--handler-seconds", type=float, default=1.0, help="Duración del handler lento")
+    parser.add_argument("--requests", type=int, default=12)
+    args = parser.parse_args()
+
+    ok = asyncio.run(run_check(args.max_inflight, args.timeout, args.handler_seconds, args.requests))
+    print("✅ El límite de concurrencia se respeta con timeouts." if ok
+          else "❌ Se superó max_inflight (o ninguna petición agotó su plazo).")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""
+Generador de carga asíncrono para la API de predicción.
+
+Lanza tráfico en lazo abierto (llegadas de Poisson a una tasa fija) o en lazo cerrado (N clientes
+concurrentes) contra /predict/ y devuelve la curva RPS vs latencia (p50/p95/p99), el goodput (respuestas
+correctas dentro del SLO por segundo) y el punto de saturación.
+
+Ejemplos:
+    python test/load_generator.py --mode open --rates 20,50,100,200 --duration 10
+    python test/load_generator.py --mode closed --concurrency 1,4,16,64 --url http://localhost:8000 \
+        --endpoint /predict/ --endpoint "/predict/?quantiles=0.1,0.9"
+    python test/load_generator.py --workers 1,2,4 --mode open --rates 50,100,200,400
+    python test/load_generator.py --admission on,off --mode open --rates 200,400,800 --slo-ms 250
+"""
+import os
+import sys
+import csv
+import time
+import random
+import asyncio
+import logging
+import argparse
+import subprocess
+import numpy as np
+import httpx
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Rangos realistas de cada variable de entrada (ver ejemplos en la documentación de /predict/)
+PAYLOAD_RANGES = {
+    "temperature": (-24.3, 38.9),
+    "humidity": (15, 100),
+    "precipitation": (0, 15.9),
+    "rain": (0, 15.9),
+    "snowfall": (0, 2.87),
+    "surface_pressure": (974.2, 1033.8),
+    "cloud_cover": (0, 100),
+    "wind_speed_10m": (0, 45.3),
+    "wind_speed_100m": (0, 78.9),
+    "wind_direction_10m": (0, 360),
+    "wind_direction_100m": (0, 360),
+}
+
+
+def random_payload(rng):
+    """Genera un EnergyPredictionRequest aleatorio dentro de los rangos observados."""
+    payload = {name: round(rng.uniform(low, high), 2) for name, (low, high) in PAYLOAD_RANGES.items()}
+    # La mayoría de las horas no llueve ni nieva
+    if rng.random() < 0.7:
+        payload.update(precipitation=0.0, rain=0.0, snowfall=0.0)
+    payload["days_since_start"] = rng.randint(0, 3650)
+    return payload
+
+
+def make_client(url, timeout):
+    """Cliente HTTP contra una URL o, si no se indica, contra la app ASGI en el mismo proceso (sin red)."""
+    if url:
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=1000)
+        return httpx.AsyncClient(base_url=url, timeout=timeout, limits=limits)
+
+    sys.path.insert(0, ROOT_DIR)
+    from main import app
+    # El log por petición de la API distorsionaría la medición
+    logging.getLogger().setLevel(logging.WARNING)
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://loadtest", timeout=timeout)
+
+
+async def send_request(client, endpoints, rng, results):
+    endpoint = rng.choice(endpoints)
+    start = time.perf_counter()
+    try:
+        response = await client.post(endpoint, json=random_payload(rng))
+        status = response.status_code
+    except httpx.HTTPError:
+        status = None  # Timeout o error de conexión
+    results.append((time.perf_counter() - start, status))
+
+
+async def run_open_loop(client, endpoints, rate, duration, rng):
+    """Lazo abierto: las peticiones llegan según un proceso de Poisson, sin esperar a las respuestas."""
+    results, tasks = [], []
+    start = time.perf_counter()
+    next_arrival = start
+    while next_arrival - start < duration:
+        delay = next_arrival - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(send_request(client, endpoints, rng, results)))
+        next_arrival += rng.expovariate(rate)
+    await asyncio.gather(*tasks)
+    return results, time.perf_counter() - start
+
+
+async def run_closed_loop(client, endpoints, concurrency, duration, think_time, rng):
+    """Lazo cerrado: N clientes que envían una nueva petición al recibir la respuesta anterior."""
+    results = []
+    start = time.perf_counter()
+
+    async def user():
+        while time.perf_counter() - start < duration:
+            await send_request(client, endpoints, rng, results)
+            if think_time:
+                await asyncio.sleep(rng.expovariate(1 / think_time))
+
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    return results, time.perf_counter() - start
+
+
+def summarize(load, results, elapsed, slo_ms):
+    """
+    Resume una etapa: RPS correctos, goodput (correctos dentro del SLO), percentiles de latencia (ms) de las
+    respuestas correctas, porcentaje rechazado por saturación (503) y resto de errores (incluidos timeouts).
+    """
+    latencies = np.array([latency for latency, status in results if status is not None and status < 400]) * 1000
+    shed = sum(1 for _, status in results if status == 503)
+    errors = sum(1 for _, status in results if status is None or status >= 400) - shed
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if len(latencies) else (float("nan"),) * 3
+    total = max(len(results), 1)
+    return {"load": load, "requests": len(results), "rps": len(latencies) / elapsed,
+            "goodput": int((latencies <= slo_ms).sum()) / elapsed,
+            "p50_ms": p50, "p95_ms": p95, "p99_ms": p99,
+            "shed_pct": shed / total * 100, "error_pct": errors / total * 100}
+
+
+def find_saturation(rows, mode, slo_ms):
+    """
+    Primera etapa saturada: en lazo abierto, cuando se sirve menos del 90% de la tasa ofrecida; en lazo
+    cerrado, cuando más concurrencia ya no aumenta el throughput un 5%. En ambos casos también si p99 supera el SLO.
+    """
+    for previous, row in zip([None] + rows[:-1], rows):
+        if row["p99_ms"] > slo_ms or row["error_pct"] + row["shed_pct"] > 1:
+            return row
+        if mode == "open" and row["rps"] < 0.9 * row["load"]:
+            return row
+        if mode == "closed" and previous is not None and row["rps"] < 1.05 * previous["rps"]:
+            return row
+    return None
+
+
+def print_report(label, rows, saturation, mode):
+    load_name = "RPS ofrecidos" if mode == "open" else "Concurrencia"
+    print(f"\n📊 {label}")
+    print(f"{load_name:>14} | {'RPS':>8} | {'goodput':>8} | {'p50 ms':>8} | {'p95 ms':>8} | {'p99 ms':>8} | "
+          f"{'503':>6} | {'errores':>7}")
+    for row in rows:
+        print(f"{row['load']:>14} | {row['rps']:>8.1f} | {row['goodput']:>8.1f} | {row['p50_ms']:>8.1f} | "
+              f"{row['p95_ms']:>8.1f} | {row['p99_ms']:>8.1f} | {row['shed_pct']:>5.1f}% | {row['error_pct']:>6.1f}%")
+    if saturation:
+        print(f"🔥 Saturación en {load_name.lower()} = {saturation['load']} ({saturation['rps']:.1f} RPS servidos)")
+    else:
+        print("✅ No se alcanzó la saturación en el rango probado.")
+
+
+async def sweep(args, url):
+    rng = random.Random(args.seed)
+    endpoints = args.endpoint or ["/predict/"]
+    loads = [float(r) for r in args.rates.split(",")] if args.mode == "open" else [int(c) for c in args.concurrency.split(",")]
+
+    rows = []
+    async with make_client(url, args.timeout) as client:
+        # Calentamiento: primera carga del modelo, conexiones, cachés
+        await asyncio.gather(*(send_request(client, endpoints, rng, []) for _ in range(20)))
+        for load in loads:
+            if args.mode == "open":
+                results, elapsed = await run_open_loop(client, endpoints, load, args.duration, rng)
+            else:
+                results, elapsed = await run_closed_loop(client, endpoints, load, args.duration, args.think_time, rng)
+            rows.append(summarize(load, results, elapsed, args.slo_ms))
+    return rows
+
+
+def start_server(workers, port, env=None):
+    """Arranca uvicorn con N workers y espera a que /healthcheck/ responda."""
+    process = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+                                "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+                               cwd=ROOT_DIR, env=dict(os.environ, **(env or {})))
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"{url}/healthcheck/", timeout=1).status_code == 200:
+                return process, url
+        except httpx.HTTPError:
+            time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError(f"El servidor con {workers} workers no arrancó en el puerto {port}.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generador de carga y reporte de capacidad de la API.")
+    parser.add_argument("--url", help="URL de la API (por defecto, la app ASGI en el mismo proceso)")
+    parser.add_argument("--workers", help="Lista de nº de workers uvicorn a arrancar y medir, Ej: 1,2,4")
+    parser.add_argument("--port", type=int, default=8100, help="Puerto para los servidores arrancados con --workers")
+    parser.add_argument("--admission", help="Comparar el control de admisión activado y desactivado, Ej: on,off "
+                                            "(arranca uvicorn, con 1 worker si no se indica --workers)")
+    parser.add_argument("--mode", choices=["open", "closed"], default="open")
+    parser.add_argument("--rates", default="10,25,50,100,200", help="RPS ofrecidos en lazo abierto")
+    parser.add_argument("--concurrency", default="1,2,4,8,16,32", help="Clientes concurrentes en lazo cerrado")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Tiempo medio de espera entre peticiones (s) en lazo cerrado")
+    parser.add_argument("--duration", type=float, default=10.0, help="Duración de cada etapa en segundos")
+    parser.add_argument("--endpoint", action="append", help="Endpoint a probar (repetible), por defecto /predict/")
+    parser.add_argument("--timeout", type=float, default=10.0, help="Timeout por petición en segundos")
+    parser.add_argument("--slo-ms", type=float, default=500.0, help="p99 máximo aceptable en milisegundos")
+    parser.add_argument("--csv", help="Guardar la curva en un CSV")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    targets = []
+    if args.workers or args.admission:
+        workers_list = [int(w) for w in (args.workers or "1").split(",")]
+        admission_list = args.admission.split(",") if args.admission else [None]
+        for w in workers_list:
+            for admission in admission_list:
+                env = {"ADMISSION_CONTROL": "true" if admission == "on" else "false"} if admission else None
+                label = f"{w} workers" + (f", control de admisión {admission}" if admission else "")
+                targets.append((label, w, env))
+    else:
+        targets = [(args.url or "app en proceso (ASGI)", None, None)]
+
+    all_rows = []
+    for label, workers, env in targets:
+        process = None
+        url = args.url
+        if workers is not None:
+            process, url = start_server(workers, args.port, env)
+        try:
+            rows = asyncio.run(sweep(args, url))
+        finally:
+            if process:
+                process.terminate()
+                process.wait()
+
+        print_report(label, rows, find_saturation(rows, args.mode, args.slo_ms), args.mode)
+        all_rows += [dict(row, target=label, mode=args.mode) for row in rows]
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(all_rows[0]))
+            writer.writeheader()
+            writer.writerows(all_rows)
+        print(f"📂 Curva guardada en {args.csv}")
+
+
+if __name__ == "__main__":
+    main()